@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from flask import current_app
+
+
+class _ScopeIndex:
+    """The cached questions of one scope: entry IDs plus their unit vectors, stacked on demand."""
+
+    def __init__(self):
+        self.ids = []
+        self.vectors = []
+        self.expires = []
+        self._snapshot = None
+
+    def add(self, entry_id, vector, expires_at):
+        self.ids.append(entry_id)
+        self.vectors.append(vector)
+        self.expires.append(expires_at)
+        self._snapshot = None
+
+    def remove(self, entry_ids):
+        keep = [i for i, entry_id in enumerate(self.ids) if entry_id not in entry_ids]
+        self.ids = [self.ids[i] for i in keep]
+        self.vectors = [self.vectors[i] for i in keep]
+        self.expires = [self.expires[i] for i in keep]
+        self._snapshot = None
+
+    def snapshot(self):
+        """(ids, matrix, expires); rebuilt only after a change, and never modified in place."""
+        if self._snapshot is None:
+            self._snapshot = (list(self.ids), np.stack(self.vectors), np.asarray(self.expires))
+        return self._snapshot
+
+
+class AnswerCache:
+    """
+    Semantic cache for chat answers.
+    A question is answered from the cache when an earlier question in the same scope
+    has a query embedding with cosine similarity >= threshold. The scope holds the
+    model, the corpus version (bumped on every ingest/delete) and the retrieval
+    settings, so answers are never shared across models or outlived by the documents
+    they were generated from.
+    Each scope keeps its unit vectors as one stacked matrix, so a lookup is a single
+    matrix-vector product, computed outside the lock.
+    - maxsize: total number of cached answers; least recently used go first
+    - ttl: seconds an answer stays valid
+    """
+
+    def __init__(self, threshold=0.95, maxsize=1000, ttl=3600):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # entry_id -> (scope, query, answer, extra), in LRU order
+        self._scopes = {}  # scope -> _ScopeIndex
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, scope, entry_ids):
+        """Drops entries of one scope. Caller holds the lock."""
+        for entry_id in entry_ids:
+            self._entries.pop(entry_id, None)
+        index = self._scopes.get(scope)
+        if index is not None:
+            index.remove(set(entry_ids))
+            if not index.ids:
+                del self._scopes[scope]
+
+    def get(self, scope, embedding):
+        """Returns (answer, extra, similarity) of the closest cached question, or None."""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            index = self._scopes.get(scope)
+            if index is None:
+                self.misses += 1
+                return None
+            ids, matrix, expires = index.snapshot()
+
+        scores = matrix @ query
+        expired = expires <= now
+        scores[expired] = -np.inf
+        best = int(np.argmax(scores))
+        best_score = float(scores[best])
+
+        with self._lock:
+            if expired.any():
+                self._remove(scope, [ids[i] for i in np.flatnonzero(expired)])
+            entry = self._entries.get(ids[best]) if best_score >= self.threshold else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(ids[best])
+            _, _, answer, extra = entry
+            return answer, extra, round(best_score, 4)
+
+    def set(self, scope, embedding, query_text, answer, extra=None):
+        if not self.enabled or not answer:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, query_text, answer, extra or {})
+            self._scopes.setdefault(scope, _ScopeIndex()).add(entry_id, self._normalize(embedding),
+                                                             time.monotonic() + self.ttl)
+            while len(self._entries) > self.maxsize:
+                oldest_id, (oldest_scope, _, _, _) = next(iter(self._entries.items()))
+                self._remove(oldest_scope, [oldest_id])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "scopes": len(self._scopes),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def init_answer_cache(app):
+    """Registers the answer cache on the Flask app. ANSWER_CACHE_SIZE=0 disables it."""
+    cache = AnswerCache(
+        threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95)),
+        maxsize=int(os.getenv('ANSWER_CACHE_SIZE', 1000)),
+        ttl=float(os.getenv('ANSWER_CACHE_TTL', 3600)),
+    )
+    app.extensions['answer_cache'] = cache
+    return cache
+
+
+def get_answer_cache():
+    return current_app.extensions['answer_cache']
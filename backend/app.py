@@ -1,19 +1,44 @@
 from flask import Flask, request, jsonify, Response
-import requests
-import os
-from database import create_connection
+import time
+from database import create_connection, pool_stats
+from auth_middleware import load_user_attributes, attribute_cache, bearer_token, current_identity, check_abac
+from auth_tokens import issue_tokens, decode_token, revocation_list, TokenError
 from mysql.connector import Error
 import hashlib
-from rag import RAGService
+from rag import init_rag_service, get_rag_service
 from blueprints.documents import documents_bp
 from blueprints.users import users_bp
+from blueprints.jobs import jobs_bp
+from jobs import init_job_queue
+from llm_client import init_llm_clients, LLMError
+from llm_router import init_llm_router, get_llm_router
+from chat_pipeline import chat_options, cache_scope, build_context, build_prompt, encode_event
+from answer_cache import init_answer_cache, get_answer_cache
+from conversations import init_conversation_store, get_conversation_store, conversation_owner
+from blueprints.conversations import conversations_bp
 
 app = Flask(__name__)
 # Register Blueprints
 app.register_blueprint(documents_bp)
 app.register_blueprint(users_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(conversations_bp)
 
-rag_service = RAGService()
+# One RAGService per process, shared with the blueprints via app.extensions.
+# The embedding model is loaded lazily on first use (or by RAG_WARMUP=1 / POST /api/ready).
+rag_service = init_rag_service(app)
+# Ingestion runs in background worker threads that share the same RAGService
+init_job_queue(app, rag_service)
+# Pooled keep-alive HTTP clients (timeouts, retries, concurrency limits) for the LLM backends
+llm_clients = init_llm_clients(app)
+# Chat requests go through a router that falls back between backends and can hedge slow calls
+llm_router = init_llm_router(app, llm_clients)
+# Semantic cache of chat answers, so paraphrased questions skip the LLM
+init_answer_cache(app)
+# Multi-turn conversations (in memory, expire when idle); summaries are generated through the router
+init_conversation_store(app, llm_router)
+# Token revocations are loaded before the first request is served, then refreshed in the background
+revocation_list.start()
 
 # Basic CORS workaround (for production use flask-cors)
 @app.after_request
@@ -27,6 +52,57 @@ def after_request(response):
 def home():
     return "Backend is running! Use the frontend to interact."
 
+# Readiness stays public for probes; loading the model and the stats endpoints below expose
+# or drive server internals, so they are admin-only like the user management pages
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness probe: reports whether the RAG model is loaded."""
+    if get_rag_service().is_ready():
+        return jsonify({"ready": True}), 200
+    return jsonify({"ready": False}), 503
+
+@app.route('/api/ready', methods=['POST'])
+@check_abac({'access_page': 'users'})
+def warm_up():
+    """Loads the RAG model (warm-up), then reports readiness like GET."""
+    rag_service = get_rag_service()
+    if not rag_service.is_ready():
+        try:
+            rag_service.warm_up()
+        except Exception as e:
+            return jsonify({"ready": False, "error": str(e)}), 503
+    return ready()
+
+@app.route('/api/rag/stats', methods=['GET'])
+@check_abac({'access_page': 'users'})
+def rag_stats():
+    """Hit/miss counters of the retrieval and embedding caches."""
+    return jsonify(get_rag_service().stats()), 200
+
+@app.route('/api/db/stats', methods=['GET'])
+@check_abac({'access_page': 'users'})
+def db_stats():
+    """MariaDB connection pool metrics (pool wait time, created/recycled connections)."""
+    return jsonify(pool_stats()), 200
+
+@app.route('/api/auth/stats', methods=['GET'])
+@check_abac({'access_page': 'users'})
+def auth_stats():
+    """Hit rate of the ABAC attribute cache and size of the token revocation list."""
+    return jsonify({"attribute_cache": attribute_cache.stats(), "revocations": revocation_list.stats()}), 200
+
+@app.route('/api/llm/stats', methods=['GET'])
+@check_abac({'access_page': 'users'})
+def llm_stats():
+    """Per-backend request/error counts, recent error rate, p50/p95 and latency histogram."""
+    return jsonify(get_llm_router().snapshot()), 200
+
+@app.route('/api/chat/cache/stats', methods=['GET'])
+@check_abac({'access_page': 'users'})
+def answer_cache_stats():
+    """Hit rate and size of the semantic answer cache."""
+    return jsonify(get_answer_cache().stats()), 200
+
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
@@ -81,23 +157,16 @@ def login():
             user = cursor.fetchone()
 
             if user:
-                # Fetch all attributes for frontend capabilities
-                cursor.execute("SELECT attr_key, attr_value FROM user_attributes WHERE user_id = %s", (user['id'],))
-                attr_rows = cursor.fetchall()
-                
-                user_attributes = {}
-                for row in attr_rows:
-                    k = row['attr_key']
-                    v = row['attr_value']
-                    if k not in user_attributes:
-                        user_attributes[k] = []
-                    user_attributes[k].append(v)
+                # Fetch all attributes for frontend capabilities. Read fresh from the DB,
+                # since they are also signed into the access token as claims.
+                user_attributes = load_user_attributes(username, cursor)['attributes']
 
                 return jsonify({
                     "message": "Login successful", 
                     "user_id": user['id'], 
                     "name": user['name'],
-                    "attributes": user_attributes
+                    "attributes": user_attributes,
+                    **issue_tokens(user['id'], username, user_attributes)
                 }), 200
             else:
                 return jsonify({"error": "Invalid username or password"}), 401
@@ -108,16 +177,99 @@ def login():
     else:
         return jsonify({"error": "Database connection failed"}), 500
 
+@app.route('/api/token/refresh', methods=['POST'])
+def refresh_token():
+    """
+    Exchanges a refresh token for a new token pair with the user's current attributes.
+    The refresh token is rotated: the one sent here is revoked.
+    """
+    data = request.get_json() or {}
+    try:
+        claims = decode_token(data.get('refresh_token') or '', 'refresh')
+    except TokenError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    conn = create_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        cursor = conn.cursor(dictionary=True)
+        entry = load_user_attributes(claims['username'], cursor)
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+    if not entry or entry['user_id'] != int(claims['sub']):
+        return jsonify({"error": "User not found"}), 401
+
+    revocation_list.revoke_token(claims)
+    return jsonify({
+        "attributes": entry['attributes'],
+        **issue_tokens(entry['user_id'], claims['username'], entry['attributes'])
+    }), 200
+
+@app.route('/api/logout', methods=['POST'])
+def logout():
+    """Revokes the caller's access token and, if sent, its refresh token."""
+    data = request.get_json(silent=True) or {}
+    for token, token_type in ((bearer_token(), 'access'), (data.get('refresh_token'), 'refresh')):
+        if not token:
+            continue
+        try:
+            revocation_list.revoke_token(decode_token(token, token_type, check_revoked=False))
+        except TokenError:
+            pass  # Already invalid
+    return jsonify({"message": "Logged out"}), 200
+
 # /api/admin/ingest is replaced by the documents blueprint APIs
 # We keep the function for now if needed for legacy tests but it's largely redundant.
 # Or better, let's remove it to avoid confusion as per plan.
 
 
+def stream_chat_response(tokens, use_sse=False, extra=None, on_done=None):
+    """
+    Forwards LLM tokens to the client as they arrive.
+    Events: {"status": "token", "token": ...} per token, then {"status": "done", "response": ...,
+    "ttft_ms": ..., "total_ms": ...}, or {"status": "error", "message": ...}.
+    Sent as NDJSON, or as Server-Sent Events when use_sse is set. `extra` is merged into the done event.
+    on_done(response_text) is called once the full answer has been streamed.
+    """
+    def encode(event):
+        return encode_event(event, use_sse)
+
+    def generate():
+        started = time.time()
+        first_token_at = None
+        parts = []
+        try:
+            for token in tokens:
+                if first_token_at is None:
+                    first_token_at = time.time()
+                parts.append(token)
+                yield encode({"status": "token", "token": token})
+
+            ttft_ms = round((first_token_at - started) * 1000) if first_token_at else None
+            total_ms = round((time.time() - started) * 1000)
+            print(f"Chat stream finished: ttft={ttft_ms}ms total={total_ms}ms")
+            done_event = {"status": "done", "response": "".join(parts), "done": True, "ttft_ms": ttft_ms, "total_ms": total_ms}
+            done_event.update(extra or {})
+            if on_done:
+                on_done(done_event["response"])
+            yield encode(done_event)
+        except Exception as e:
+            yield encode({"status": "error", "message": str(e)})
+
+    mimetype = 'text/event-stream' if use_sse else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     data = request.get_json()
     user_message = data.get('message')
-    model = data.get('model', 'ollama')  # Default to ollama
+    # stream=true forwards tokens as they are generated (NDJSON, or SSE with format=sse)
+    stream = bool(data.get('stream', False))
+    use_sse = data.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
 
     if not user_message:
         return jsonify({"error": "Message is required"}), 400
@@ -125,82 +277,95 @@ def chat():
     # Retrieve context from RAG
     # We always use RAG context if available, or we could make it optional.
     # User said "Use this data for RAG service", so we assume always.
-    context_docs = rag_service.query(user_message)
-    context_text = "\n\n".join(context_docs)
+    # Retrieval only sees documents the caller may read (public ones without a token);
+    # a token that is present but invalid is rejected rather than treated as anonymous
+    try:
+        identity = current_identity()
+    except TokenError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    try:
+        options = chat_options(data, identity)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    model = options['model']
+    rag_service = get_rag_service()
+    # The requested model (default Ollama, llama3.2:1b) goes first. "fallback": false pins it;
+    # "hedge": true races the fallback backend once the first exceeds its p95 latency
+    # (non-streaming answers only; a stream sticks to the backend whose tokens it started sending).
+    router = get_llm_router()
+    fallback = data.get('fallback', True) is not False
+
+    # Multi-turn chat: with conversation_id (or "conversation": true to start one) the prompt gets
+    # the rolling summary and recent turns, and retrieval uses the follow-up rewritten into a
+    # standalone question, so the client never resends the transcript.
+    conversation = None
+    history = ""
+    search_query = user_message
+    if data.get('conversation_id') or data.get('conversation'):
+        store = get_conversation_store()
+        owner = conversation_owner(identity)
+        conversation = store.get(data['conversation_id'], owner) if data.get('conversation_id') else store.create(owner)
+        if conversation is None:
+            return jsonify({"error": "Conversation not found"}), 404
+        turn_id = conversation.reserve_turn_id()
+        history = store.history_text(conversation)
+        rewrite_prompt = store.rewrite_prompt(conversation, user_message)
+        if rewrite_prompt:
+            try:
+                search_query = router.generate(model, rewrite_prompt, fallback=fallback).strip()
+            except LLMError as e:
+                print(f"Query rewrite failed: {e}")
+                search_query = ""
+            search_query = search_query or store.fallback_query(conversation, user_message)
+        turn_info = {"conversation_id": conversation.id, "turn_id": turn_id, "search_query": search_query}
+    else:
+        turn_info = {}
+
+    # Semantic answer cache: a close enough paraphrase asked before, against the same corpus
+    # version, model and retrieval settings, is answered without retrieval or generation.
+    # Follow-ups depend on their history, so only standalone questions use it.
+    answer_cache = get_answer_cache()
+    scope = None
+    if options['use_cache'] and answer_cache.enabled and not history:
+        query_embedding = rag_service.embed_query(user_message)
+        scope = cache_scope(options, rag_service.collection_version)
+        cached = answer_cache.get(scope, query_embedding)
+        if cached is not None:
+            answer, cached_extra, similarity = cached
+            if conversation is not None:
+                store.add_turn(conversation, turn_id, user_message, answer, model)
+            extra = dict(cached_extra, cached=True, similarity=similarity, **turn_info)
+            if stream:
+                return stream_chat_response(iter([answer]), use_sse, extra=extra)
+            return jsonify(dict(extra, response=answer, done=True))
+
+    # Filled by the router: which backend answered, and whether it was a fallback or hedged call
+    routing = {}
+
+    def remember(answer):
+        # Only cache answers from the requested model; a fallback answer belongs to another scope
+        if scope is not None and routing.get('backend') == routing.get('requested'):
+            answer_cache.set(scope, query_embedding, user_message, answer, {"context": context_report})
+        if conversation is not None:
+            store.add_turn(conversation, turn_id, user_message, answer, model)
+
+    context_docs, context_report = build_context(rag_service, search_query, options)
     
     # Construct prompt with context
-    system_prompt = "당신은 대학 입시를 돕는 유용한 도우미입니다. 다음 문맥을 사용하여 사용자의 질문에 답하세요. 만약 문맥에 정답이 없다면 일반적인 지식을 사용하되, 제공된 문서에서 나온 정보가 아님을 언급하세요. 모든 답변은 한국어로 작성해야 합니다."
-    full_prompt = f"{system_prompt}\n\nContext:\n{context_text}\n\nUser Question:\n{user_message}"
+    full_prompt = build_prompt(context_docs, user_message, history)
 
-    if model == 'gemini':
-        try:
-            # Try to read gemini.key from ../env/gemini.key (relative to backend folder)
-            key_path = '../env/gemini.key'
-            if not os.path.exists(key_path):
-                 # Fallback to check absolute path or other locations if needed
-                 key_path = '/home/judgejack/working_space/studying_vibe/env/gemini.key'
-            
-            if not os.path.exists(key_path):
-                return jsonify({"error": "Gemini API key file not found at studying_vibe/env/gemini.key"}), 500
-
-            with open(key_path, 'r') as f:
-                api_key = f.read().strip()
-
-            if not api_key:
-                return jsonify({"error": "Gemini API key is empty"}), 500
-
-            # Call Gemini API
-            url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
-            payload = {
-                "contents": [{
-                    "parts": [{"text": full_prompt}] 
-                }]
-            }
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'x-goog-api-key': api_key
-            }
-            
-            response = requests.post(url, json=payload, headers=headers)
-            
-            if response.status_code == 200:
-                result = response.json()
-                # Extract text from Gemini response structure
-                try:
-                    bot_text = result['candidates'][0]['content']['parts'][0]['text']
-                    return jsonify({"response": bot_text, "done": True}) # Match Ollama format roughly
-                except (KeyError, IndexError):
-                     return jsonify({"error": f"Unexpected response format from Gemini: {result}"}), 500
-            else:
-                return jsonify({"error": f"Gemini API Error: {response.status_code} {response.text}"}), response.status_code
+    if stream:
+        return stream_chat_response(router.stream(model, full_prompt, fallback=fallback, info=routing), use_sse,
+                                    extra=dict({"context": context_report, "cached": False, "routing": routing}, **turn_info),
+                                    on_done=remember)
 
-        except Exception as e:
-            return jsonify({"error": f"Gemini integration failed: {str(e)}"}), 500
-
-    else:
-        # Default to Ollama (llama2 or specified model)
-        # Using llama3.2:1b as requested for "ollama" option default
-        ollama_model = "llama3.2:1b"
-        
-        try:
-            # Call Ollama API
-            ollama_response = requests.post(
-                'http://localhost:11434/api/generate',
-                json={
-                    "model": ollama_model,
-                    "prompt": full_prompt, # Use the prompt with context
-                    "stream": False
-                }
-            )
-            
-            if ollama_response.status_code == 200:
-                return jsonify(ollama_response.json())
-            else:
-                return jsonify({"error": f"Failed to get response from Ollama. Status: {ollama_response.status_code}, Response: {ollama_response.text}"}), 500
-                
-        except requests.exceptions.RequestException as e:
-            return jsonify({"error": f"Ollama connection failed: {str(e)}"}), 500
+    try:
+        bot_text = router.generate(model, full_prompt, fallback=fallback, hedge=bool(data.get('hedge')), info=routing)
+    except LLMError as e:
+        return jsonify({"error": str(e), "routing": routing}), e.status_code
+    remember(bot_text)
+    return jsonify(dict({"response": bot_text, "done": True, "context": context_report, "cached": False,
+                         "routing": routing}, **turn_info))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,319 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.routing import Route, Mount
+from a2wsgi import WSGIMiddleware
+from app import app as flask_app
+from async_llm_client import create_async_llm_clients
+from llm_client import LLMError
+from llm_router import AsyncLLMRouter, router_settings
+from chat_pipeline import chat_options, cache_scope, build_context, build_prompt, encode_event
+from auth_middleware import identity_from_token
+from auth_tokens import TokenError
+from conversations import conversation_owner
+
+# asyncio serving mode:
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000
+# /api/chat and /api/retrieve are served by coroutines: LLM calls use non-blocking HTTP and
+# embedding/search run in a bounded thread pool, so a chat waiting on the model costs a coroutine,
+# not an OS thread. Every other route is the Flask app (blueprints included), mounted below.
+
+# Retrieval (embedding, Chroma, BM25, rerank) is CPU/IO bound sync code; concurrent queries in
+# this pool still share one embedding forward pass through the RAGService query batcher.
+rag_executor = ThreadPoolExecutor(max_workers=int(os.getenv('RAG_EXECUTOR_WORKERS', 8)), thread_name_prefix="rag")
+# Backpressure: chats beyond this many in flight are turned away with 503 instead of queueing without bound
+MAX_INFLIGHT = int(os.getenv('ASYNC_MAX_INFLIGHT', 256))
+
+# Same CORS headers as the Flask after_request hook
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,PUT,POST,DELETE,OPTIONS',
+}
+
+llm_router = None
+inflight = 0  # Only touched from the event loop thread, so no lock
+
+
+def run_sync(func, *args):
+    return asyncio.get_running_loop().run_in_executor(rag_executor, func, *args)
+
+
+def error_response(message, status_code):
+    headers = dict(CORS_HEADERS)
+    if status_code == 503:
+        headers['Retry-After'] = '1'
+    return JSONResponse({"error": message}, status_code=status_code, headers=headers)
+
+
+def caller_identity(request):
+    """
+    Verified caller from the bearer token, or None without one. An invalid token raises
+    TokenError (see auth_middleware.current_identity).
+    """
+    header = request.headers.get('authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    return identity_from_token(header[len('Bearer '):].strip())
+
+
+class Slot:
+    """One in-flight slot. release() only counts once, so every exit path may call it."""
+
+    def __init__(self):
+        self.released = False
+
+    def release(self):
+        global inflight
+        if not self.released:
+            self.released = True
+            inflight -= 1
+
+
+def admit():
+    """Takes an in-flight slot. Returns None when the server is saturated."""
+    global inflight
+    if inflight >= MAX_INFLIGHT:
+        return None
+    inflight += 1
+    return Slot()
+
+
+async def read_body(request):
+    """The JSON object of a request body. Raises ValueError for anything else."""
+    try:
+        data = await request.json()
+    except ValueError:
+        raise ValueError("Request body must be valid JSON")
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return data
+
+
+def stream_chat_response(tokens, slot, use_sse=False, extra=None, on_done=None):
+    """
+    Async version of app.stream_chat_response: same events, tokens come from an async iterator.
+    The slot is released when the body ends, and also by a background task that Starlette runs
+    after the response even if the client went away before the body was ever iterated.
+    """
+    async def generate():
+        started = time.time()
+        first_token_at = None
+        parts = []
+        try:
+            async for token in tokens:
+                if first_token_at is None:
+                    first_token_at = time.time()
+                parts.append(token)
+                yield encode_event({"status": "token", "token": token}, use_sse)
+
+            ttft_ms = round((first_token_at - started) * 1000) if first_token_at else None
+            total_ms = round((time.time() - started) * 1000)
+            print(f"Chat stream finished: ttft={ttft_ms}ms total={total_ms}ms")
+            done_event = {"status": "done", "response": "".join(parts), "done": True, "ttft_ms": ttft_ms, "total_ms": total_ms}
+            done_event.update(extra or {})
+            if on_done:
+                on_done(done_event["response"])
+            yield encode_event(done_event, use_sse)
+        except Exception as e:
+            yield encode_event({"status": "error", "message": str(e)}, use_sse)
+        finally:
+            slot.release()
+
+    headers = dict(CORS_HEADERS, **{'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    mimetype = 'text/event-stream' if use_sse else 'application/x-ndjson'
+    return StreamingResponse(generate(), media_type=mimetype, headers=headers, background=BackgroundTask(slot.release))
+
+
+async def single(text):
+    yield text
+
+
+async def chat(request):
+    if request.method == 'OPTIONS':
+        return JSONResponse({}, headers=CORS_HEADERS)
+    slot = admit()
+    if slot is None:
+        return error_response("Server is busy, try again later", 503)
+
+    # A streaming response releases its slot when the stream ends, everything else right here
+    streaming = False
+    try:
+        try:
+            identity = caller_identity(request)
+        except TokenError as e:
+            return error_response(str(e), e.status_code)
+        try:
+            data = await read_body(request)
+            options = chat_options(data, identity)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        user_message = data.get('message')
+        stream = bool(data.get('stream', False))
+        use_sse = data.get('format') == 'sse' or 'text/event-stream' in request.headers.get('accept', '')
+
+        if not user_message:
+            return error_response("Message is required", 400)
+
+        model = options['model']
+        rag_service = flask_app.extensions['rag_service']
+        answer_cache = flask_app.extensions['answer_cache']
+        fallback = data.get('fallback', True) is not False
+
+        # Multi-turn chat, see app.chat
+        conversation = None
+        history = ""
+        search_query = user_message
+        turn_info = {}
+        if data.get('conversation_id') or data.get('conversation'):
+            store = flask_app.extensions['conversation_store']
+            owner = conversation_owner(identity)
+            conversation = store.get(data['conversation_id'], owner) if data.get('conversation_id') else store.create(owner)
+            if conversation is None:
+                return error_response("Conversation not found", 404)
+            turn_id = conversation.reserve_turn_id()
+            history = store.history_text(conversation)
+            rewrite_prompt = store.rewrite_prompt(conversation, user_message)
+            if rewrite_prompt:
+                try:
+                    search_query = (await llm_router.generate(model, rewrite_prompt, fallback=fallback)).strip()
+                except LLMError as e:
+                    print(f"Query rewrite failed: {e}")
+                    search_query = ""
+                search_query = search_query or store.fallback_query(conversation, user_message)
+            turn_info = {"conversation_id": conversation.id, "turn_id": turn_id, "search_query": search_query}
+
+        scope = None
+        if options['use_cache'] and answer_cache.enabled and not history:
+            query_embedding = await run_sync(rag_service.embed_query, user_message)
+            scope = cache_scope(options, rag_service.collection_version)
+            # The similarity search is a matrix product; keep it off the event loop
+            cached = await run_sync(answer_cache.get, scope, query_embedding)
+            if cached is not None:
+                answer, cached_extra, similarity = cached
+                if conversation is not None:
+                    store.add_turn(conversation, turn_id, user_message, answer, model)
+                extra = dict(cached_extra, cached=True, similarity=similarity, **turn_info)
+                if stream:
+                    streaming = True
+                    return stream_chat_response(single(answer), slot, use_sse, extra=extra)
+                return JSONResponse(dict(extra, response=answer, done=True), headers=CORS_HEADERS)
+
+        routing = {}
+
+        def remember(answer):
+            if scope is not None and routing.get('backend') == routing.get('requested'):
+                answer_cache.set(scope, query_embedding, user_message, answer, {"context": context_report})
+            if conversation is not None:
+                store.add_turn(conversation, turn_id, user_message, answer, model)
+
+        context_docs, context_report = await run_sync(build_context, rag_service, search_query, options)
+        full_prompt = build_prompt(context_docs, user_message, history)
+
+        if stream:
+            streaming = True
+            return stream_chat_response(llm_router.stream(model, full_prompt, fallback=fallback, info=routing), slot, use_sse,
+                                        extra=dict({"context": context_report, "cached": False, "routing": routing}, **turn_info),
+                                        on_done=remember)
+
+        try:
+            bot_text = await llm_router.generate(model, full_prompt, fallback=fallback,
+                                                 hedge=bool(data.get('hedge')), info=routing)
+        except LLMError as e:
+            return error_response(str(e), e.status_code)
+        remember(bot_text)
+        return JSONResponse(dict({"response": bot_text, "done": True, "context": context_report, "cached": False,
+                                  "routing": routing}, **turn_info), headers=CORS_HEADERS)
+    finally:
+        if not streaming:
+            slot.release()
+
+
+async def retrieve(request):
+    """
+    Retrieval only: {"query": ..., "k", "hybrid", "rerank", "candidates"} -> {"chunks": [{id, content, metadata}]}.
+    Useful for checking what the chat would see without paying for generation.
+    """
+    if request.method == 'OPTIONS':
+        return JSONResponse({}, headers=CORS_HEADERS)
+    slot = admit()
+    if slot is None:
+        return error_response("Server is busy, try again later", 503)
+    try:
+        try:
+            identity = caller_identity(request)
+        except TokenError as e:
+            return error_response(str(e), e.status_code)
+        try:
+            data = await read_body(request)
+            options = chat_options(data, identity)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        query_text = data.get('query')
+        if not query_text:
+            return error_response("Query is required", 400)
+        rag_service = flask_app.extensions['rag_service']
+        chunks = await run_sync(lambda: rag_service.retrieve(
+            query_text, k=options['k'], hybrid=options['hybrid'],
+            rerank=options['rerank'], candidates=options['candidates'], tags=options['tags']))
+        return JSONResponse({"chunks": chunks}, headers=CORS_HEADERS)
+    finally:
+        slot.release()
+
+
+def require_attribute(request, key, value):
+    """Error response unless the caller's token carries the attribute (see auth_middleware.check_abac)."""
+    try:
+        identity = caller_identity(request)
+    except TokenError as e:
+        return error_response(str(e), e.status_code)
+    if identity is None:
+        return error_response("Authentication required (token missing)", 401)
+    if value not in identity['attributes'].get(key, []):
+        return error_response(f"Permission denied for attribute: {key} (Required: {value})", 403)
+    return None
+
+
+async def async_stats(request):
+    """In-flight chats and executor size of the asyncio serving mode. Admin-only, like the Flask stats."""
+    error = require_attribute(request, 'access_page', 'users')
+    if error:
+        return error
+    return JSONResponse({"inflight": inflight, "max_inflight": MAX_INFLIGHT,
+                         "rag_executor_workers": rag_executor._max_workers}, headers=CORS_HEADERS)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global llm_router
+    # Shares the Flask router's stats, so /api/llm/stats covers both serving paths, and the Flask
+    # clients' concurrency slots, so OLLAMA_MAX_CONCURRENCY / GEMINI_MAX_CONCURRENCY are one limit
+    llm_router = AsyncLLMRouter(create_async_llm_clients(flask_app.extensions['llm_clients']),
+                                stats=flask_app.extensions['llm_router'].stats, **router_settings())
+    yield
+    for client in llm_router.clients.values():
+        await client.aclose()
+    rag_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/chat', chat, methods=['POST', 'OPTIONS']),
+        Route('/api/retrieve', retrieve, methods=['POST', 'OPTIONS']),
+        Route('/api/async/stats', async_stats, methods=['GET']),
+        # Everything else (auth, documents, users, jobs, stats) is the existing Flask app.
+        # a2wsgi runs it in its own thread pool, like a WSGI server would.
+        Mount('/', app=WSGIMiddleware(flask_app, workers=int(os.getenv('WSGI_WORKERS', 10)))),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,160 @@
+import os
+import time
+import json
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+import httpx
+from llm_client import (LLMError, LLMBusyError, OLLAMA_URL, OLLAMA_MODEL, GEMINI_URL, GEMINI_KEY_PATHS,
+                        load_gemini_key, gemini_payload, gemini_text, gemini_stream_texts)
+
+SLOT_POLL_INTERVAL = 0.02  # Seconds between tries for a slot of a busy backend
+
+
+class AsyncLLMClient:
+    """
+    asyncio counterpart of LLMClient, used by the ASGI serving mode (asgi.py).
+    One httpx.AsyncClient per backend keeps connections alive; a request waiting on
+    the LLM is a suspended coroutine instead of a blocked thread. Connection errors
+    are retried by the transport. A caller that cannot get a slot within acquire_timeout
+    gets LLMBusyError (503).
+    Concurrent calls are capped by a threading semaphore, normally the `slots` of the Flask
+    LLMClient for the same backend, so one limit (e.g. OLLAMA_MAX_CONCURRENCY) holds across
+    both serving paths of asgi.py. The event loop never blocks on it: a busy semaphore is
+    polled every SLOT_POLL_INTERVAL seconds.
+    """
+
+    def __init__(self, name, base_url, max_concurrency=4, connect_timeout=3.0, read_timeout=120.0,
+                 retries=2, acquire_timeout=30.0, slots=None):
+        self.name = name
+        self.base_url = base_url
+        self.acquire_timeout = acquire_timeout
+        self._slots = slots or threading.BoundedSemaphore(max_concurrency)
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            transport=httpx.AsyncHTTPTransport(retries=retries, limits=limits),
+        )
+
+    @asynccontextmanager
+    async def post(self, path, wait=True, **kwargs):
+        """
+        Streams a POST to base_url + path while holding a concurrency slot. Yields the response.
+        With wait=False a call that finds no free slot fails at once instead of queueing.
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        while not self._slots.acquire(blocking=False):
+            if not wait or time.monotonic() >= deadline:
+                raise LLMBusyError(f"{self.name} is busy, try again later")
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+        try:
+            # Full URL on purpose: Gemini paths start with ':' and would not join onto a base_url
+            async with self.client.stream('POST', self.base_url + path, **kwargs) as response:
+                yield response
+        finally:
+            self._slots.release()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class AsyncOllamaClient(AsyncLLMClient):
+    def __init__(self, model=OLLAMA_MODEL, **kwargs):
+        super().__init__('ollama', OLLAMA_URL, **kwargs)
+        self.model = model
+
+    async def generate(self, prompt, wait=True):
+        """Returns the full Ollama generate response (dict with 'response', 'done', ...)."""
+        try:
+            async with self.post('/api/generate', json={"model": self.model, "prompt": prompt, "stream": False}, wait=wait) as response:
+                await response.aread()
+                if response.status_code != 200:
+                    raise LLMError(f"Failed to get response from Ollama. Status: {response.status_code}, Response: {response.text}")
+                return response.json()
+        except httpx.HTTPError as e:
+            raise LLMError(f"Ollama connection failed: {str(e)}")
+
+    async def stream(self, prompt, wait=True):
+        """Yields response tokens from Ollama's streaming generate API."""
+        try:
+            async with self.post('/api/generate', json={"model": self.model, "prompt": prompt, "stream": True}, wait=wait) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise LLMError(f"Failed to get response from Ollama. Status: {response.status_code}, Response: {response.text}")
+                # Ollama streams one JSON object per line
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('response'):
+                        yield chunk['response']
+                    if chunk.get('done'):
+                        break
+        except httpx.HTTPError as e:
+            raise LLMError(f"Ollama connection failed: {str(e)}")
+
+
+class AsyncGeminiClient(AsyncLLMClient):
+    def __init__(self, key_paths=None, **kwargs):
+        super().__init__('gemini', GEMINI_URL, **kwargs)
+        self.key_paths = key_paths or GEMINI_KEY_PATHS
+        self._api_key = None
+        self._key_lock = threading.Lock()
+
+    @property
+    def api_key(self):
+        """The API key, read from disk once. Raises ValueError with a user-facing message if missing."""
+        if self._api_key is None:
+            with self._key_lock:
+                if self._api_key is None:
+                    self._api_key = load_gemini_key(self.key_paths)
+        return self._api_key
+
+    def _headers(self):
+        return {'Content-Type': 'application/json', 'x-goog-api-key': self.api_key}
+
+    async def generate(self, prompt, wait=True):
+        """Returns the generated text."""
+        try:
+            async with self.post(':generateContent', json=gemini_payload(prompt), headers=self._headers(), wait=wait) as response:
+                await response.aread()
+                if response.status_code != 200:
+                    raise LLMError(f"Gemini API Error: {response.status_code} {response.text}", response.status_code)
+                result = response.json()
+        except httpx.HTTPError as e:
+            raise LLMError(f"Gemini integration failed: {str(e)}")
+        return gemini_text(result)
+
+    async def stream(self, prompt, wait=True):
+        """Yields response tokens from Gemini's streamGenerateContent API (SSE)."""
+        try:
+            async with self.post(':streamGenerateContent?alt=sse', json=gemini_payload(prompt), headers=self._headers(),
+                                 wait=wait) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise LLMError(f"Gemini API Error: {response.status_code} {response.text}", response.status_code)
+                # httpx falls back to UTF-8 when the response has no charset, so Korean text survives
+                async for line in response.aiter_lines():
+                    for text in gemini_stream_texts(line.strip()):
+                        yield text
+        except httpx.HTTPError as e:
+            raise LLMError(f"Gemini integration failed: {str(e)}")
+
+
+def create_async_llm_clients(shared_clients=None):
+    """
+    One client per backend, configured by the same environment variables as init_llm_clients.
+    With shared_clients (the Flask LLM clients), each backend shares their concurrency slots.
+    """
+    shared_clients = shared_clients or {}
+    common = {
+        "connect_timeout": float(os.getenv('LLM_CONNECT_TIMEOUT', 3)),
+        "read_timeout": float(os.getenv('LLM_READ_TIMEOUT', 120)),
+        "retries": int(os.getenv('LLM_RETRIES', 2)),
+    }
+    return {
+        'ollama': AsyncOllamaClient(max_concurrency=int(os.getenv('OLLAMA_MAX_CONCURRENCY', 2)),
+                                    slots=getattr(shared_clients.get('ollama'), 'slots', None), **common),
+        'gemini': AsyncGeminiClient(max_concurrency=int(os.getenv('GEMINI_MAX_CONCURRENCY', 8)),
+                                    slots=getattr(shared_clients.get('gemini'), 'slots', None), **common),
+    }
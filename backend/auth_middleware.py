@@ -1,77 +1,117 @@
+import os
+import threading
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, g
 from database import create_connection
+from cache import TTLCache
+from auth_tokens import decode_token, TokenError
+
+# Identification by a plain X-Username header/field, kept only for old clients and scripts
+LEGACY_USERNAME_AUTH = os.getenv('AUTH_LEGACY_USERNAME', '0') == '1'
+
+# username -> {"user_id": ..., "attributes": {key: [values]}}
+# Short TTL so attribute changes made outside the API (migration scripts) still show up quickly.
+attribute_cache = TTLCache(maxsize=int(os.getenv('ABAC_CACHE_SIZE', 4096)), ttl=int(os.getenv('ABAC_CACHE_TTL', 30)))
+_usernames_by_id = {}
+_usernames_lock = threading.Lock()
+
+def fetch_user_attributes(cursor, user_id):
+    """Loads all attributes of a user as a dict of lists: {key: [value1, value2]}."""
+    cursor.execute("SELECT attr_key, attr_value FROM user_attributes WHERE user_id = %s", (user_id,))
+    user_attrs = {}
+    for row in cursor.fetchall():
+        key = row['attr_key']
+        val = row['attr_value']
+        if key not in user_attrs:
+            user_attrs[key] = []
+        user_attrs[key].append(val)
+    return user_attrs
+
+def cache_user_attributes(username, user_id, attributes):
+    entry = {"user_id": user_id, "attributes": attributes}
+    attribute_cache.set(username, entry)
+    with _usernames_lock:
+        _usernames_by_id[user_id] = username
+    return entry
+
+def get_user_attributes(username, cursor):
+    """
+    Returns {"user_id": ..., "attributes": {...}} for a username, or None if the user does not exist.
+    Served from attribute_cache when possible; the cursor is only used on a miss.
+    """
+    entry = attribute_cache.get(username)
+    if entry is not None:
+        return entry
+    return load_user_attributes(username, cursor)
+
+def load_user_attributes(username, cursor):
+    """Reads a user's attributes from the DB and caches them. Returns None if the user does not exist."""
+    cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
+    user = cursor.fetchone()
+    if not user:
+        return None  # Not cached, so a user registered a moment later is found
+    return cache_user_attributes(username, user['id'], fetch_user_attributes(cursor, user['id']))
+
+def invalidate_user_attributes(user_id):
+    """Drops the cached attributes of a user after they were changed."""
+    with _usernames_lock:
+        username = _usernames_by_id.pop(user_id, None)
+    if username is not None:
+        attribute_cache.delete(username)
+
+def bearer_token():
+    """The token from an 'Authorization: Bearer <token>' header, or None."""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip() or None
+    return None
+
+def identity_from_token(token):
+    """Verified identity from an access token. Signature, expiry and revocation are checked in memory only."""
+    claims = decode_token(token, 'access')
+    return {"user_id": int(claims['sub']), "username": claims['username'], "attributes": claims.get('attrs', {})}
+
+def current_identity():
+    """
+    Identity of the caller for endpoints that work without login but behave differently
+    with one (e.g. chat retrieval filters). None without a token; a token that is present but
+    invalid, expired or revoked raises TokenError (a 401), so it never silently turns anonymous.
+    """
+    token = bearer_token()
+    if not token:
+        return None
+    return identity_from_token(token)
 
 def check_abac(required_attributes):
     """
     Decorator to check if the user has specific attributes.
     required_attributes: dict of {key: value} that the user must match.
     Example: @check_abac({'role': 'admin'})
+    The caller identifies with a signed access token from /api/login (Authorization: Bearer ...).
+    The token carries the user ID and attributes, so this check needs no DB access.
+    The verified identity is available to the view as flask.g.user.
     """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # 1. basic auth check: user_id from session or body?
-            # Since we don't have a full session system yet, we rely on the client sending 'username' or similar credential.
-            # Ideally this should use a token/session from request headers/cookies.
-            # For this MVP refactor, let's assume the frontend sends 'username' in the JSON body for protected actions,
-            # OR we rely on a simplified header 'X-User-ID' or similar if we change the auth flow.
-            
-            # Re-reading the `app.py`:
-            # - /api/admin/ingest used `username` in body.
-            # - /api/chat used `model` in body, no user check yet.
-            
-            # Let's standardize on extracting user identity. 
-            # Given the constraints, let's check JSON body for 'username' or 'user_id' as a fallback, 
-            # but for a GET request (like listing docs), we might need query params or headers.
-            # Let's try to get 'username' from request.json or request.args.
-            
-            # Priority: Header (X-Username) > JSON Body > Form Data > Query Args (Legacy/Fallback)
-            username = request.headers.get('X-Username')
-
-            if not username:
-                if request.is_json:
-                    username = request.get_json().get('username')
-                elif request.form:
-                    # Handle multipart/form-data for uploads
-                    username = request.form.get('username')
-            
-            # Fallback to args (to be removed later, or kept for strict debugging/legacy)
-            if not username:
-                username = request.args.get('username')
-            
-            if not username:
-                return jsonify({"error": "Authentication required (username missing)"}), 401
-
-            conn = create_connection()
-            if not conn:
-                 return jsonify({"error": "Database error"}), 500
+            token = bearer_token()
+            if token:
+                try:
+                    entry = identity_from_token(token)
+                except TokenError as e:
+                    return jsonify({"error": str(e)}), e.status_code
+            elif LEGACY_USERNAME_AUTH:
+                entry, error = identity_from_username()
+                if error:
+                    return error
+            else:
+                return jsonify({"error": "Authentication required (token missing)"}), 401
 
             try:
-                cursor = conn.cursor(dictionary=True)
-                
-                # Get User ID
-                cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-                user = cursor.fetchone()
-                if not user:
-                    return jsonify({"error": "User not found"}), 401
-                
-                user_id = user['id']
-
                 # Check Attributes
                 # We need to verify if the user has ALL the required attributes with the matching values.
-                # Query: Get all attributes for this user
-                cursor.execute("SELECT attr_key, attr_value FROM user_attributes WHERE user_id = %s", (user_id,))
-                user_attrs_rows = cursor.fetchall()
-                
-                # Convert to dict of lists: {key: [value1, value2]}
-                user_attrs = {}
-                for row in user_attrs_rows:
-                    key = row['attr_key']
-                    val = row['attr_value']
-                    if key not in user_attrs:
-                        user_attrs[key] = []
-                    user_attrs[key].append(val)
+                # user_attrs is a dict of lists: {key: [value1, value2]}
+                user_attrs = entry['attributes']
                 
                 # Legacy 'role' check removed. Only user_attributes are used.
                 # If we need a 'role' concept, it should be an attribute like {'role': ['admin']}
@@ -85,14 +125,54 @@ def check_abac(required_attributes):
                     if req_val not in user_attrs[req_key]:
                         return jsonify({"error": f"Permission denied for attribute: {req_key} (Required: {req_val})"}), 403
                 
+                g.user = entry
                 # If we pass all checks
                 return f(*args, **kwargs)
 
             except Exception as e:
                 print(f"Auth specific error: {e}")
                 return jsonify({"error": "Authorization check failed"}), 500
-            finally:
-                conn.close()
 
         return decorated_function
     return decorator
+
+def identity_from_username():
+    """
+    Legacy identification by a plain username (AUTH_LEGACY_USERNAME=1 only; anyone can send any username).
+    Priority: Header (X-Username) > JSON Body > Form Data > Query Args.
+    Returns (entry, None) or (None, error response).
+    """
+    username = request.headers.get('X-Username')
+
+    if not username:
+        if request.is_json:
+            username = request.get_json().get('username')
+        elif request.form:
+            # Handle multipart/form-data for uploads
+            username = request.form.get('username')
+    
+    if not username:
+        username = request.args.get('username')
+    
+    if not username:
+        return None, (jsonify({"error": "Authentication required (username missing)"}), 401)
+
+    # Cached attributes need no DB connection at all
+    entry = attribute_cache.get(username)
+    if entry is not None:
+        return dict(entry, username=username), None
+
+    conn = create_connection()
+    if not conn:
+        return None, (jsonify({"error": "Database error"}), 500)
+    try:
+        cursor = conn.cursor(dictionary=True)
+        entry = load_user_attributes(username, cursor)
+    except Exception as e:
+        print(f"Auth specific error: {e}")
+        return None, (jsonify({"error": "Authorization check failed"}), 500)
+    finally:
+        conn.close()
+    if not entry:
+        return None, (jsonify({"error": "User not found"}), 401)
+    return dict(entry, username=username), None
@@ -0,0 +1,216 @@
+import os
+import time
+import uuid
+import secrets
+import threading
+import jwt
+from mysql.connector import Error
+from database import create_connection
+
+TOKEN_ALGORITHM = 'HS256'
+ACCESS_TOKEN_TTL = int(os.getenv('ACCESS_TOKEN_TTL', 900))  # 15 minutes
+REFRESH_TOKEN_TTL = int(os.getenv('REFRESH_TOKEN_TTL', 7 * 24 * 3600))
+
+
+# A random per-process key is only acceptable for local development: tokens then only verify in
+# the process that issued them, so with several workers or after a restart every user is logged out
+ALLOW_RANDOM_SECRET = os.getenv('FLASK_DEBUG', '0') == '1' or os.getenv('AUTH_ALLOW_RANDOM_SECRET', '0') == '1'
+
+
+def _load_secret():
+    secret = os.getenv('AUTH_TOKEN_SECRET')
+    if not secret:
+        if not ALLOW_RANDOM_SECRET:
+            raise RuntimeError("AUTH_TOKEN_SECRET is not set; set it in .env "
+                               "(or FLASK_DEBUG=1 / AUTH_ALLOW_RANDOM_SECRET=1 for local development)")
+        print("AUTH_TOKEN_SECRET is not set, using a random per-process signing key (development only)")
+        secret = secrets.token_hex(32)
+    return secret
+
+_secret = _load_secret()
+
+
+class TokenError(Exception):
+    """Raised for missing, malformed, expired or revoked tokens. Always a 401 for the client."""
+
+    def __init__(self, message, status_code=401):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _encode(claims, ttl):
+    now = time.time()
+    # iat keeps sub-second precision so a token issued right after a user revocation is not caught by it
+    payload = dict(claims, iat=now, exp=int(now + ttl), jti=uuid.uuid4().hex)
+    return jwt.encode(payload, _secret, algorithm=TOKEN_ALGORITHM)
+
+
+def issue_tokens(user_id, username, attributes):
+    """
+    Signed token pair for a logged-in user.
+    The access token carries the user ID and attribute claims, so check_abac needs no DB;
+    the refresh token only identifies the user and is exchanged for a new pair.
+    """
+    subject = {"sub": str(user_id), "username": username}
+    return {
+        "access_token": _encode(dict(subject, type="access", attrs=attributes), ACCESS_TOKEN_TTL),
+        "refresh_token": _encode(dict(subject, type="refresh"), REFRESH_TOKEN_TTL),
+        "token_type": "Bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+    }
+
+
+def decode_token(token, expected_type="access", check_revoked=True):
+    """Verifies signature, expiry, type and revocation. Returns the claims or raises TokenError."""
+    try:
+        claims = jwt.decode(token, _secret, algorithms=[TOKEN_ALGORITHM],
+                            options={"require": ["exp", "iat", "jti", "sub"]})
+    except jwt.ExpiredSignatureError:
+        raise TokenError("Token expired")
+    except jwt.InvalidTokenError:
+        raise TokenError("Invalid token")
+    if claims.get('type') != expected_type:
+        raise TokenError("Invalid token type")
+    if check_revoked and revocation_list.is_revoked(claims):
+        raise TokenError("Token revoked")
+    return claims
+
+
+class RevocationList:
+    """
+    Revoked tokens, mirrored in memory so checking a token never touches the DB.
+    Two kinds of entries live in the token_revocations table:
+    - a jti: that single token (logout, rotated refresh tokens)
+    - a user_id without jti: every access token of the user issued before revoked_at
+      (attributes changed, so the claims in those tokens are stale)
+    start() loads the table before the server takes requests, then a background thread
+    reloads it every refresh_interval seconds so revocations made by other processes show
+    up; revocations made here apply immediately.
+    Rows are kept until the tokens they cover would have expired anyway; reload() deletes
+    them after that. A reload merges the table into the entries held in memory, so a
+    revocation made here during the reload, or one whose insert failed, is not lost.
+    """
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._jtis = {}   # jti -> expires_at
+        self._users = {}  # user_id -> (revoked_at, expires_at)
+        self._lock = threading.Lock()
+        self._refresher = None
+        self.loaded_at = None
+        self.checks = 0
+        self.rejected = 0
+
+    def start(self):
+        """Loads the revocations now, on the calling thread, and starts the background refresher."""
+        self.reload()
+        if self.loaded_at is None:
+            print("Token revocations could not be loaded at startup; retrying in the background")
+        self._ensure_refresher()
+
+    def _ensure_refresher(self):
+        # Also started lazily by is_revoked, for scripts that decode tokens without start()
+        if self._refresher is None:
+            with self._lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(target=self._run, name="token-revocations", daemon=True)
+                    self._refresher.start()
+
+    def _run(self):
+        while True:
+            if self.loaded_at is not None:
+                time.sleep(self.refresh_interval)
+            self.reload()
+            if self.loaded_at is None:
+                time.sleep(self.refresh_interval)  # DB unreachable; try again later
+
+    def reload(self):
+        conn = create_connection()
+        if not conn:
+            return  # Keep serving the list we have
+        now = time.time()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("DELETE FROM token_revocations WHERE expires_at <= %s", (now,))
+            conn.commit()
+            cursor.execute("SELECT jti, user_id, revoked_at, expires_at FROM token_revocations WHERE expires_at > %s",
+                           (now,))
+            jtis, users = {}, {}
+            for row in cursor.fetchall():
+                if row['jti']:
+                    jtis[row['jti']] = row['expires_at']
+                elif row['user_id'] is not None:
+                    previous = users.get(row['user_id'])
+                    if previous is None or row['revoked_at'] > previous[0]:
+                        users[row['user_id']] = (row['revoked_at'], row['expires_at'])
+            with self._lock:
+                # Keep in-memory revocations the table does not have (yet)
+                for jti, expires_at in self._jtis.items():
+                    if expires_at > now:
+                        jtis.setdefault(jti, expires_at)
+                for user_id, (revoked_at, expires_at) in self._users.items():
+                    previous = users.get(user_id)
+                    if expires_at > now and (previous is None or revoked_at > previous[0]):
+                        users[user_id] = (revoked_at, expires_at)
+                self._jtis = jtis
+                self._users = users
+                self.loaded_at = time.time()
+        except Error as e:
+            print(f"Could not reload token revocations: {e}")
+        finally:
+            conn.close()
+
+    def is_revoked(self, claims):
+        self._ensure_refresher()
+        with self._lock:
+            self.checks += 1
+            revoked = claims['jti'] in self._jtis
+            if not revoked and claims.get('type') == 'access':
+                user = self._users.get(int(claims['sub']))
+                revoked = user is not None and claims['iat'] <= user[0]
+            if revoked:
+                self.rejected += 1
+            return revoked
+
+    def _store(self, jti, user_id, revoked_at, expires_at):
+        conn = create_connection()
+        if not conn:
+            print("Token revocation not persisted (DB connection failed); only this process knows it")
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO token_revocations (jti, user_id, revoked_at, expires_at) VALUES (%s, %s, %s, %s)",
+                           (jti, user_id, revoked_at, expires_at))
+            conn.commit()
+        except Error as e:
+            print(f"Token revocation not persisted: {e}")
+        finally:
+            conn.close()
+
+    def revoke_token(self, claims):
+        """Revokes one token, given its decoded claims."""
+        with self._lock:
+            self._jtis[claims['jti']] = claims['exp']
+        self._store(claims['jti'], int(claims['sub']), time.time(), claims['exp'])
+
+    def revoke_user(self, user_id):
+        """Revokes every access token the user holds right now; refreshing yields fresh claims."""
+        revoked_at = time.time()
+        expires_at = revoked_at + ACCESS_TOKEN_TTL
+        with self._lock:
+            self._users[user_id] = (revoked_at, expires_at)
+        self._store(None, user_id, revoked_at, expires_at)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "revoked_tokens": len(self._jtis),
+                "revoked_users": len(self._users),
+                "checks": self.checks,
+                "rejected": self.rejected,
+                "loaded_at": self.loaded_at,
+                "refresh_interval": self.refresh_interval,
+            }
+
+
+revocation_list = RevocationList(refresh_interval=int(os.getenv('TOKEN_REVOCATION_REFRESH', 30)))
@@ -0,0 +1,86 @@
+import os
+import time
+from document_access import PUBLIC_TAG, viewer_tags, tags_from_metadata
+from rag import RAGService
+
+# Per-tenant retrieval latency with the access filter pushed into the Chroma / BM25 queries.
+# Tenants are: unrestricted (no filter), anonymous (public documents only) and one tenant per
+# access tag found in the index. Run from backend/ after migrate_document_access.py:
+#   python benchmark_retrieval_acl.py
+BENCH_K = int(os.getenv('BENCH_K', 10))
+BENCH_ROUNDS = int(os.getenv('BENCH_ROUNDS', 5))
+
+QUERIES = [
+    "수시 모집 일정이 어떻게 되나요?",
+    "정시 전형에서 수능 반영 비율은?",
+    "학생부종합전형 서류 평가 기준",
+    "논술 전형 준비 방법",
+    "미적분 과목 선택이 필요한가요?",
+    "면접 전형은 어떻게 진행되나요?",
+    "지역균형전형 지원 자격",
+    "최저학력기준이 있는 전형",
+]
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+def tenants(rag_service):
+    """(name, tags) pairs; tags is what RAGService.retrieve filters on (None = unrestricted)."""
+    result = [("unrestricted", None), ("anonymous", viewer_tags(None))]
+    for tag in sorted(rag_service.bm25.access_tags()):
+        if tag == PUBLIC_TAG:
+            continue
+        key, _, value = tag.partition('=')
+        result.append((tag, viewer_tags({"attributes": {key: [value]}})))
+    return result
+
+def bench_tenant(rag_service, tags, hybrid):
+    latencies = []
+    filled = 0
+    for _ in range(BENCH_ROUNDS):
+        for query in QUERIES:
+            # Cached results would measure the cache, not the filtered index query
+            rag_service.query_result_cache.clear()
+            started = time.perf_counter()
+            chunks = rag_service.retrieve(query, k=BENCH_K, hybrid=hybrid, rerank=False, tags=tags)
+            latencies.append((time.perf_counter() - started) * 1000)
+            filled += len(chunks)
+            if tags is not None:
+                # Filtering inside the query must never return a chunk the tenant cannot read
+                assert all(set(tags_from_metadata(chunk['metadata'])) & set(tags) for chunk in chunks)
+    runs = len(latencies)
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "avg_ms": sum(latencies) / runs,
+        "avg_results": filled / runs,
+    }
+
+def post_filter_yield(rag_service, tags):
+    """Average results a post-filter over the unfiltered top-k would have left for this tenant."""
+    kept = 0
+    for query in QUERIES:
+        chunks = rag_service.retrieve(query, k=BENCH_K, hybrid=False, rerank=False)
+        kept += sum(1 for chunk in chunks if set(tags_from_metadata(chunk['metadata'])) & set(tags))
+    return kept / len(QUERIES)
+
+def run_benchmark():
+    rag_service = RAGService()
+    print(f"Collection: {rag_service.db._collection.count()} chunks, k={BENCH_K}, "
+          f"{len(QUERIES)} queries x {BENCH_ROUNDS} rounds")
+
+    # Embed every query once, so the numbers only cover the index queries
+    for query in QUERIES:
+        rag_service.embed_query(query)
+
+    print(f"{'tenant':<32} {'mode':<7} {'p50 ms':>8} {'p95 ms':>8} {'avg ms':>8} {'results':>8} {'post-filter':>12}")
+    for name, tags in tenants(rag_service):
+        post_filter = f"{post_filter_yield(rag_service, tags):.1f}" if tags is not None else "-"
+        for hybrid in (False, True):
+            stats = bench_tenant(rag_service, tags, hybrid)
+            print(f"{name[:32]:<32} {'hybrid' if hybrid else 'vector':<7} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+                  f"{stats['avg_ms']:>8.1f} {stats['avg_results']:>8.1f} {post_filter if not hybrid else '':>12}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,44 @@
+from flask import Blueprint, jsonify
+from auth_middleware import current_identity
+from auth_tokens import TokenError
+from conversations import get_conversation_store, conversation_owner
+
+conversations_bp = Blueprint('conversations', __name__)
+
+# Turns are added through POST /api/chat with {"conversation_id": ..., "message": ...}
+# A conversation belongs to the caller who created it (their access token, or anonymous);
+# other callers get a 404, the same as for an unknown ID.
+
+def caller_owner():
+    """(owner, None) for the caller, or (None, error response) for an invalid token."""
+    try:
+        return conversation_owner(current_identity()), None
+    except TokenError as e:
+        return None, (jsonify({"error": str(e)}), e.status_code)
+
+@conversations_bp.route('/api/conversations', methods=['POST'])
+def create_conversation():
+    owner, error = caller_owner()
+    if error:
+        return error
+    conversation = get_conversation_store().create(owner)
+    return jsonify({"conversation_id": conversation.id}), 201
+
+@conversations_bp.route('/api/conversations/<conversation_id>', methods=['GET'])
+def get_conversation(conversation_id):
+    owner, error = caller_owner()
+    if error:
+        return error
+    conversation = get_conversation_store().get(conversation_id, owner)
+    if conversation is None:
+        return jsonify({"error": "Conversation not found"}), 404
+    return jsonify(conversation.to_dict()), 200
+
+@conversations_bp.route('/api/conversations/<conversation_id>', methods=['DELETE'])
+def delete_conversation(conversation_id):
+    owner, error = caller_owner()
+    if error:
+        return error
+    if not get_conversation_store().delete(conversation_id, owner):
+        return jsonify({"error": "Conversation not found"}), 404
+    return jsonify({"message": "Conversation deleted"}), 200
@@ -1,19 +1,19 @@
 import os
-from flask import Blueprint, request, jsonify, current_app, Response
+import uuid
+import base64
+import binascii
+import hashlib
+import zipfile
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app, Response, g
 import json
 from database import create_connection
 from auth_middleware import check_abac
 from werkzeug.utils import secure_filename
-from rag import RAGService
-
-# Assuming RAGService is initialized in app.py and available via current_app or we instantiate a shared one?
-# Better to have it available. For now, let's look at how app.py does it.
-# app.py: rag_service = RAGService()
-# We should probably pass it or import a singleton. 
-# For this refactor, let's assume we can import a shared instance or initialize it here (Chroma is distinct).
-# However, initializing `RAGService` twice might be okay if they point to the same persist dir.
-# Let's instantiate it here for simplicity, ensuring same persist_directory.
-rag_service = RAGService()
+from rag import get_rag_service
+from jobs import get_job_queue
+from cache import TTLCache
+from document_access import parse_access, dump_access
 
 documents_bp = Blueprint('documents', __name__)
 
@@ -21,12 +21,99 @@ UPLOAD_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../p
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Server-side directory imports are only allowed below this root (disabled when unset)
+BULK_IMPORT_ROOT = os.getenv('BULK_IMPORT_ROOT')
+# ZIP uploads: limits on the number of entries and on the total uncompressed size (bytes)
+BULK_ZIP_MAX_MEMBERS = int(os.getenv('BULK_ZIP_MAX_MEMBERS', 1000))
+BULK_ZIP_MAX_BYTES = int(os.getenv('BULK_ZIP_MAX_BYTES', 2 * 1024 ** 3))
+
+# Cached document count for the pager, so listing a page does not scan the whole table
+document_count_cache = TTLCache(maxsize=1, ttl=float(os.getenv('DOCUMENT_COUNT_TTL', 60)))
+
+def save_and_hash(stream):
+    """Streams a file object to a temporary path in UPLOAD_FOLDER. Returns (tmp_path, sha256 hex)."""
+    tmp_path = os.path.join(UPLOAD_FOLDER, f".upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    with open(tmp_path, 'wb') as out:
+        for block in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(block)
+            out.write(block)
+    return tmp_path, digest.hexdigest()
+
+def job_response(job_id):
+    """
+    Ingestion runs in the background job queue, so a dropped connection no longer stops it.
+    With background=1 the job handle is returned right away (202). Otherwise the job's
+    events are streamed as NDJSON, exactly like the old inline ingestion.
+    """
+    if request.values.get('background') == '1':
+        return jsonify({
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}",
+            "events_url": f"/api/jobs/{job_id}/events"
+        }), 202
+
+    job_queue = get_job_queue()
+    def generate():
+        for event in job_queue.stream(job_id):
+            yield json.dumps(event) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Job-ID': job_id})
+
+def form_access():
+    """
+    Access rule of an upload: the 'access' form field, a JSON object such as
+    {"department": ["engineering"]}. Missing or empty means every user may retrieve the document.
+    Raises ValueError for malformed rules.
+    """
+    return parse_access(request.form.get('access'))
+
+def encode_cursor(doc):
+    """Opaque keyset cursor for the (created_at, id) position of a document row."""
+    raw = f"{doc['created_at'].isoformat()}|{doc['id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(value):
+    """Returns (created_at, id). Raises ValueError for malformed cursors."""
+    created_at, doc_id = base64.urlsafe_b64decode(value.encode('ascii')).decode('utf-8').split('|')
+    return datetime.fromisoformat(created_at), int(doc_id)
+
+def count_documents(cursor):
+    """
+    Total number of documents, cached for DOCUMENT_COUNT_TTL seconds.
+    The value shown in the pager may lag behind by that much; uploads and
+    deletes through this API reset it right away.
+    """
+    total = document_count_cache.get('total')
+    if total is None:
+        cursor.execute("SELECT COUNT(*) as total FROM documents")
+        total_result = cursor.fetchone()
+        total = total_result['total'] if total_result else 0
+        document_count_cache.set('total', total)
+    return total
+
 @documents_bp.route('/api/documents', methods=['GET'])
-@check_abac({'access_page': 'documents'}) # Updated to new attribute logic
+@check_abac({'access_page': 'documents'})
 def get_documents():
-    page = int(request.args.get('page', 1))
-    limit = int(request.args.get('limit', 10))
-    offset = (page - 1) * limit
+    """
+    Lists documents newest first.
+    - ?cursor=<next_cursor>&limit=N: keyset pagination on (created_at, id); cost does not grow with depth
+    - ?page=N&limit=N: the old offset pagination, kept for existing clients
+    Both return next_cursor (null on the last page) and an approximate total.
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        return jsonify({"error": "limit and page must be integers"}), 400
+    cursor_param = request.args.get('cursor')
+
+    position = None
+    if cursor_param:
+        try:
+            position = decode_cursor(cursor_param)
+        except (ValueError, UnicodeDecodeError, binascii.Error):
+            return jsonify({"error": "Invalid cursor"}), 400
 
     conn = create_connection()
     if not conn:
@@ -35,15 +122,36 @@ def get_documents():
     try:
         cursor = conn.cursor(dictionary=True)
         
-        # Get total count
-        cursor.execute("SELECT COUNT(*) as total FROM documents")
-        total_result = cursor.fetchone()
-        total_docs = total_result['total'] if total_result else 0
+        total_docs = count_documents(cursor)
         
-        # Get paginated documents
-        cursor.execute("SELECT id, filename, description, created_at FROM documents ORDER BY created_at DESC LIMIT %s OFFSET %s", (limit, offset))
+        # One extra row tells whether there is a next page.
+        # Both queries walk idx_documents_created_at (created_at, id) backwards; the row
+        # comparison lets the keyset query start as a range scan on that index.
+        if position is not None:
+            created_at, doc_id = position
+            cursor.execute(
+                "SELECT id, filename, description, access_attributes, created_at FROM documents "
+                "WHERE (created_at, id) < (%s, %s) "
+                "ORDER BY created_at DESC, id DESC LIMIT %s",
+                (created_at, doc_id, limit + 1)
+            )
+        else:
+            offset = (page - 1) * limit
+            cursor.execute(
+                "SELECT id, filename, description, access_attributes, created_at FROM documents "
+                "ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s",
+                (limit + 1, offset)
+            )
         docs = cursor.fetchall()
         
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor(docs[-1])
+
+        for doc in docs:
+            doc['access'] = parse_access(doc.pop('access_attributes'))
+        
         total_pages = (total_docs + limit - 1) // limit
 
         return jsonify({
@@ -51,7 +159,8 @@ def get_documents():
             "total": total_docs,
             "page": page,
             "limit": limit,
-            "total_pages": total_pages
+            "total_pages": total_pages,
+            "next_cursor": next_cursor
         }), 200
     finally:
         conn.close()
@@ -59,14 +168,34 @@ def get_documents():
 @documents_bp.route('/api/documents/<int:doc_id>', methods=['PUT'])
 @check_abac({'access_page': 'documents'})
 def update_document(doc_id):
+    """
+    Updates the description and/or the access rule ("access": {key: [values]} or null for public).
+    A new access rule is applied to the indexed chunks in place, without re-embedding.
+    """
     data = request.get_json()
-    description = data.get('description')
+
+    try:
+        access = parse_access(data.get('access')) if 'access' in data else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     conn = create_connection()
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("UPDATE documents SET description = %s WHERE id = %s", (description, doc_id))
+        cursor.execute("SELECT filename FROM documents WHERE id = %s", (doc_id,))
+        doc = cursor.fetchone()
+        if not doc:
+            return jsonify({"error": "Document not found"}), 404
+
+        if 'description' in data:
+            cursor.execute("UPDATE documents SET description = %s WHERE id = %s", (data.get('description'), doc_id))
+        if 'access' in data:
+            cursor.execute("UPDATE documents SET access_attributes = %s WHERE id = %s", (dump_access(access), doc_id))
         conn.commit()
+
+        if 'access' in data:
+            updated = get_rag_service().set_access(doc['filename'], access)
+            return jsonify({"message": f"Document updated. Access changed on {updated} chunks."}), 200
         return jsonify({"message": "Document updated"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -84,58 +213,202 @@ def upload_document():
         return jsonify({"error": "No selected file"}), 400
 
     if file and file.filename.endswith('.pdf'):
+        try:
+            access = form_access()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         filename = secure_filename(file.filename)
         filepath = os.path.join(UPLOAD_FOLDER, filename)
-        
-        # Check if file exists? Overwrite?
-        file.save(filepath)
+
+        # Write to a temporary file while hashing, so a duplicate never overwrites the indexed copy
+        tmp_path, content_hash = save_and_hash(file.stream)
 
         # DB Insert
         conn = create_connection()
         try:
             cursor = conn.cursor(dictionary=True)
+
+            # Same bytes already indexed: skip parsing and embedding entirely (force=1 re-ingests anyway)
+            if request.form.get('force') != '1':
+                cursor.execute("SELECT id, filename FROM documents WHERE content_hash = %s LIMIT 1", (content_hash,))
+                existing = cursor.fetchone()
+                if existing:
+                    os.remove(tmp_path)
+                    update = {
+                        "status": "success",
+                        "message": f"Identical file already indexed as {existing['filename']}. Skipped ingestion.",
+                        "duplicate": True,
+                        "document_id": existing['id']
+                    }
+                    # A finished job, so background=1 gets its usual 202 handle
+                    return job_response(get_job_queue().complete('ingest', [update]))
+
+            os.replace(tmp_path, filepath)
+            tmp_path = None
             
-            # Since we are using ABAC/simplified auth, getting user_id is tricky if we don't have full session.
-            # We used 'username' in body for check_abac. logic.
-            # check_abac doesn't return user info to the function.
-            # Let's verify user again or assume 1 (admin placeholder) if not critical.
-            # But the user specifically asked for 'uploaded_by' FK.
-            # Let's get username from request (check_abac ensures it's there).
-            username = request.form.get('username') 
-            if not username:
-                 # Should have been caught by middleware if middleware was strictly checking body for JSON.
-                 # But file upload is multipart/form-data!
-                 # check_abac needs to handle form-data too.
-                 pass
-
-            # Update check_abac for form-data?
-            # For now, let's fetch user again.
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            user = cursor.fetchone()
-            user_id = user['id'] if user else None
-
-            cursor.execute("INSERT INTO documents (filename, filepath, uploaded_by) VALUES (%s, %s, %s)", 
-                           (filename, filepath, user_id))
+            # check_abac verified the uploader and put them on flask.g
+            user_id = g.user['user_id']
+
+            # The file on disk now has other bytes than older rows for this path were indexed with.
+            # The new hash is only recorded by the ingest job once it succeeds.
+            cursor.execute("UPDATE documents SET content_hash = NULL WHERE filepath = %s", (filepath,))
+            cursor.execute("INSERT INTO documents (filename, filepath, uploaded_by, access_attributes) VALUES (%s, %s, %s, %s)", 
+                           (filename, filepath, user_id, dump_access(access)))
             conn.commit()
+            document_count_cache.clear()
             
             # Get settings from form data
             chunk_size = int(request.form.get('chunk_size', 1000))
             chunk_overlap = int(request.form.get('chunk_overlap', 200))
+            batch_size = request.form.get('batch_size', type=int)
 
-            # RAG Ingest with Streaming Response
-            def generate():
-                for update in rag_service.ingest_file(filepath, chunk_size=chunk_size, chunk_overlap=chunk_overlap):
-                    yield json.dumps(update) + "\n"
-            
-            return Response(generate(), mimetype='application/x-ndjson')
+            # RAG Ingest as a background job
+            job_id = get_job_queue().submit('ingest', {
+                "filepath": filepath,
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "batch_size": batch_size,
+                "access": access,
+                "content_hash": content_hash
+            })
+            return job_response(job_id)
 
         except Exception as e:
             return jsonify({"error": str(e)}), 500
         finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             conn.close()
     
     return jsonify({"error": "Invalid file type (PDF only)"}), 400
 
+def collect_bulk_sources():
+    """
+    Yields (filename, stream opener) for every PDF in a bulk request:
+    uploaded PDFs, PDFs inside uploaded ZIP archives, and PDFs in a server-side directory.
+    """
+    for file in request.files.getlist('files'):
+        name = file.filename or ''
+        if name.endswith('.pdf'):
+            yield secure_filename(name), (lambda f=file: f.stream)
+        elif name.endswith('.zip'):
+            archive = zipfile.ZipFile(file.stream)
+            members = archive.infolist()
+            # zipfile never inflates an entry past its declared size, so the headers can be trusted here
+            if len(members) > BULK_ZIP_MAX_MEMBERS:
+                raise ValueError(f"{name} has {len(members)} entries (limit {BULK_ZIP_MAX_MEMBERS})")
+            if sum(member.file_size for member in members) > BULK_ZIP_MAX_BYTES:
+                raise ValueError(f"{name} is larger than {BULK_ZIP_MAX_BYTES} bytes uncompressed")
+            for member in members:
+                member_name = os.path.basename(member.filename)
+                if member.is_dir() or not member_name.endswith('.pdf'):
+                    continue
+                yield secure_filename(member_name), (lambda a=archive, m=member: a.open(m))
+
+    directory = request.form.get('directory')
+    if directory:
+        directory = os.path.realpath(directory)
+        if not BULK_IMPORT_ROOT or not directory.startswith(os.path.realpath(BULK_IMPORT_ROOT) + os.sep):
+            raise ValueError("Directory import is not allowed for this path")
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.pdf'):
+                yield secure_filename(name), (lambda p=os.path.join(directory, name): open(p, 'rb'))
+
+@documents_bp.route('/api/documents/bulk', methods=['POST'])
+@check_abac({'access_page': 'documents'})
+def bulk_upload_documents():
+    """
+    Bulk ingest: many PDFs ('files'), ZIP archives ('files') and/or a server 'directory'.
+    Files are hashed while saved, byte-identical duplicates are skipped, all new document
+    rows are inserted in one batch and the files are ingested in parallel by one job.
+    The 'access' form field applies to every file of the request.
+    """
+    saved = []    # (filename, filepath, content_hash)
+    skipped = []  # {"filename", "reason"}
+    tmp_paths = []
+    conn = None
+
+    try:
+        access = form_access()
+        staged = []
+        for filename, open_stream in collect_bulk_sources():
+            stream = open_stream()
+            try:
+                tmp_path, content_hash = save_and_hash(stream)
+            finally:
+                stream.close()
+            tmp_paths.append(tmp_path)
+            staged.append((filename, tmp_path, content_hash))
+
+        if not staged:
+            return jsonify({"error": "No PDF files found"}), 400
+
+        # Only take a DB connection once the (slow) file transfer is done
+        conn = create_connection()
+        if not conn:
+            return jsonify({"error": "DB Connection failed"}), 500
+        cursor = conn.cursor(dictionary=True)
+        force = request.form.get('force') == '1'
+        known = set()
+        if not force:
+            hashes = list({h for _, _, h in staged})
+            placeholders = ",".join(["%s"] * len(hashes))
+            cursor.execute(f"SELECT content_hash FROM documents WHERE content_hash IN ({placeholders})", hashes)
+            known = {row['content_hash'] for row in cursor.fetchall()}
+
+        used_names = set()
+        for filename, tmp_path, content_hash in staged:
+            if content_hash in known:
+                skipped.append({"filename": filename, "reason": "Identical file already indexed"})
+                continue
+            if filename in used_names:
+                skipped.append({"filename": filename, "reason": "Duplicate file name in this upload"})
+                continue
+            known.add(content_hash)
+            used_names.add(filename)
+            filepath = os.path.join(UPLOAD_FOLDER, filename)
+            os.replace(tmp_path, filepath)
+            saved.append((filename, filepath, content_hash))
+
+        user_id = g.user['user_id']
+
+        # One round trip and one commit for all new rows. Hashes are recorded per file by the job
+        # once that file is ingested; overwritten paths lose their old hash right away.
+        if saved:
+            placeholders = ",".join(["%s"] * len(saved))
+            cursor.execute(f"UPDATE documents SET content_hash = NULL WHERE filepath IN ({placeholders})",
+                           [filepath for _, filepath, _ in saved])
+            cursor.executemany(
+                "INSERT INTO documents (filename, filepath, uploaded_by, access_attributes) VALUES (%s, %s, %s, %s)",
+                [(filename, filepath, user_id, dump_access(access)) for filename, filepath, _ in saved]
+            )
+            conn.commit()
+            document_count_cache.clear()
+
+        job_id = get_job_queue().submit('bulk_ingest', {
+            "documents": [{"filename": filename, "filepath": filepath, "content_hash": content_hash}
+                          for filename, filepath, content_hash in saved],
+            "skipped": skipped,
+            "chunk_size": int(request.form.get('chunk_size', 1000)),
+            "chunk_overlap": int(request.form.get('chunk_overlap', 200)),
+            "batch_size": request.form.get('batch_size', type=int),
+            "concurrency": request.form.get('concurrency', type=int),
+            "access": access
+        })
+        return job_response(job_id)
+
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if conn:
+            conn.close()
+
 @documents_bp.route('/api/documents/<int:doc_id>', methods=['DELETE'])
 @check_abac({'access_page': 'documents'})
 def delete_document(doc_id):
@@ -156,13 +429,14 @@ def delete_document(doc_id):
         # Delete from DB
         cursor.execute("DELETE FROM documents WHERE id = %s", (doc_id,))
         conn.commit()
+        document_count_cache.clear()
         
         # Delete from Disk
         if os.path.exists(filepath):
             os.remove(filepath)
             
         # Delete from RAG
-        success, msg = rag_service.delete_file(filename)
+        success, msg = get_rag_service().delete_file(filename)
         
         return jsonify({"message": f"Document deleted. {msg}"}), 200
         
@@ -174,6 +448,19 @@ def delete_document(doc_id):
 @documents_bp.route('/api/documents/<int:doc_id>/chunks', methods=['GET'])
 @check_abac({'access_page': 'documents'})
 def get_document_chunks(doc_id):
+    # Paging: ?offset=&limit= (limit capped at 500). Projection: ?fields=metadata skips the text.
+    # Page filters: ?pages=0,1,2 or ?page_from=&page_to= (0-based, as stored in chunk metadata).
+    # Malformed values are rejected with a 400 before any DB or vector store work.
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        pages = [int(p) for p in request.args.get('pages', '').split(',') if p.strip()]
+        page_from = int(request.args['page_from']) if request.args.get('page_from') else None
+        page_to = int(request.args['page_to']) if request.args.get('page_to') else None
+    except ValueError:
+        return jsonify({"error": "offset, limit, pages, page_from and page_to must be integers"}), 400
+    include_content = request.args.get('fields', 'all') != 'metadata'
+
     conn = create_connection()
     if not conn:
         return jsonify({"error": "DB Connection failed"}), 500
@@ -187,9 +474,17 @@ def get_document_chunks(doc_id):
             return jsonify({"error": "Document not found"}), 404
             
         filename = doc['filename']
-        
-        chunks = rag_service.get_chunks_by_filename(filename)
-        return jsonify(chunks), 200
+
+        rag_service = get_rag_service()
+        chunks, next_offset = rag_service.get_chunks_by_filename(
+            filename, offset=offset, limit=limit, include_content=include_content, pages=pages,
+            page_from=page_from, page_to=page_to
+        )
+        # The total is only counted for the first page, later pages skip that extra scan.
+        # It counts with the same page filters, so it matches what paging walks through.
+        total = rag_service.count_chunks(filename, pages=pages, page_from=page_from, page_to=page_to) if offset == 0 else None
+
+        return jsonify({"chunks": chunks, "offset": offset, "limit": limit, "next_offset": next_offset, "total": total}), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -202,7 +497,7 @@ def reingest_document(doc_id):
     conn = create_connection()
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT filename, filepath FROM documents WHERE id = %s", (doc_id,))
+        cursor.execute("SELECT filename, filepath, access_attributes FROM documents WHERE id = %s", (doc_id,))
         doc = cursor.fetchone()
         
         if not doc:
@@ -210,13 +505,19 @@ def reingest_document(doc_id):
 
         chunk_size = int(request.form.get('chunk_size', 1000))
         chunk_overlap = int(request.form.get('chunk_overlap', 200))
+        batch_size = request.form.get('batch_size', type=int)
 
-        def generate():
-            yield json.dumps({"status": "info", "message": f"Starting re-ingestion for {doc['filename']}..."}) + "\n"
-            for update in rag_service.ingest_file(doc['filepath'], chunk_size=chunk_size, chunk_overlap=chunk_overlap):
-                yield json.dumps(update) + "\n"
-
-        return Response(generate(), mimetype='application/x-ndjson')
+        job_id = get_job_queue().submit('ingest', {
+            "filepath": doc['filepath'],
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "batch_size": batch_size,
+            # dry_run=1 only reports which chunks would be added, removed or updated
+            "dry_run": request.values.get('dry_run') == '1',
+            "access": parse_access(doc['access_attributes']),
+            "start_message": f"Starting re-ingestion for {doc['filename']}..."
+        })
+        return job_response(job_id)
 
     finally:
         conn.close()
@@ -227,25 +528,21 @@ def reingest_all_documents():
     conn = create_connection()
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id, filename, filepath FROM documents ORDER BY created_at DESC")
+        cursor.execute("SELECT id, filename, filepath, access_attributes FROM documents ORDER BY created_at DESC")
         documents = cursor.fetchall()
         
         chunk_size = int(request.form.get('chunk_size', 1000))
         chunk_overlap = int(request.form.get('chunk_overlap', 200))
+        batch_size = request.form.get('batch_size', type=int)
 
-        def generate():
-            total_docs = len(documents)
-            for idx, doc in enumerate(documents):
-                yield json.dumps({"status": "info", "message": f"[{idx+1}/{total_docs}] Processing {doc['filename']}..."}) + "\n"
-                for update in rag_service.ingest_file(doc['filepath'], chunk_size=chunk_size, chunk_overlap=chunk_overlap):
-                    # Prefix update messages to indicate which file is being processed
-                    if update['status'] == 'info':
-                        update['message'] = f"[{doc['filename']}] {update['message']}"
-                    yield json.dumps(update) + "\n"
-            
-            yield json.dumps({"status": "success", "message": f"Completed re-ingestion of {total_docs} documents."}) + "\n"
-
-        return Response(generate(), mimetype='application/x-ndjson')
+        job_id = get_job_queue().submit('reingest_all', {
+            "documents": [{"filename": doc['filename'], "filepath": doc['filepath'],
+                           "access": parse_access(doc['access_attributes'])} for doc in documents],
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "batch_size": batch_size
+        })
+        return job_response(job_id)
 
     finally:
         conn.close()
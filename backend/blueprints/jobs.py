@@ -0,0 +1,47 @@
+from flask import Blueprint, request, jsonify, Response
+import json
+from auth_middleware import check_abac
+from jobs import get_job_queue
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/api/jobs', methods=['GET'])
+@check_abac({'access_page': 'documents'})
+def list_jobs():
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify(get_job_queue().list(limit=limit)), 200
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+@check_abac({'access_page': 'documents'})
+def get_job(job_id):
+    job = get_job_queue().get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@jobs_bp.route('/api/jobs/<job_id>/events', methods=['GET'])
+@check_abac({'access_page': 'documents'})
+def get_job_events(job_id):
+    """Streams job progress as NDJSON. Use ?after=<seq> to resume, ?follow=0 for a one-shot read."""
+    job_queue = get_job_queue()
+    if not job_queue.get(job_id):
+        return jsonify({"error": "Job not found"}), 404
+
+    try:
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return jsonify({"error": "after must be an integer"}), 400
+    follow = request.args.get('follow', '1') == '1'
+
+    def generate():
+        if follow:
+            for event in job_queue.stream(job_id, after=after):
+                yield json.dumps(event) + "\n"
+        else:
+            for seq, event in job_queue.events(job_id, after=after):
+                yield json.dumps(event) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
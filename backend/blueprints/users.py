@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from database import create_connection
-from auth_middleware import check_abac
+from auth_middleware import check_abac, invalidate_user_attributes
+from auth_tokens import revocation_list
 
 users_bp = Blueprint('users', __name__)
 
@@ -80,6 +81,10 @@ def manage_user_attributes(user_id):
                 message = "Attribute removed"
             
             conn.commit()
+            # Cached permissions must not outlive the change
+            invalidate_user_attributes(user_id)
+            # Access tokens carry the old attributes as claims; the client refreshes to get new ones
+            revocation_list.revoke_user(user_id)
             return jsonify({"message": message}), 200
             
         except Exception as e:
@@ -0,0 +1,238 @@
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_HANGUL_RE = re.compile(r'[가-힣]')
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens. Korean words also get character bigrams, since
+    particles are glued to the stem ("미적분학은" should still match "미적분").
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text.lower()):
+        tokens.append(word)
+        if len(word) > 2 and _HANGUL_RE.search(word):
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    Persistent inverted index (SQLite) with Okapi BM25 scoring.
+    Catches exact terms such as course codes and formula names that dense
+    embeddings tend to miss. Chunks are keyed by their vector store ID.
+    Access tags (see document_access) are kept per source file, so searches can be
+    restricted to the files a caller may read inside the SQL query itself.
+
+    The database runs in WAL mode: writes go through one connection under a lock,
+    searches use a read connection per thread and never wait for each other or for
+    ingestion. Document frequencies are kept in their own table, so a search can skip
+    terms found in more than max_df_ratio of all chunks (common Korean bigrams) without
+    scanning their posting lists; their IDF is close to zero anyway. Terms in at most
+    min_skip_df chunks are always scored, so small corpora are not affected.
+    """
+
+    def __init__(self, path="./bm25_index.sqlite", k1=1.5, b=0.75, max_df_ratio=0.2, min_skip_df=1000):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self.min_skip_df = min_skip_df
+        self._lock = threading.Lock()  # Serializes writes only
+        self._local = threading.local()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                chunk_id TEXT PRIMARY KEY,
+                source_file TEXT NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (chunk_id);
+            CREATE INDEX IF NOT EXISTS idx_docs_source ON docs (source_file);
+            CREATE TABLE IF NOT EXISTS source_access (
+                source_file TEXT NOT NULL,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (tag, source_file)
+            );
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        # Index files built before the terms table existed
+        if self._conn.execute("SELECT 1 FROM terms LIMIT 1").fetchone() is None:
+            self._conn.execute("INSERT INTO terms (term, df) SELECT term, COUNT(*) FROM postings GROUP BY term")
+        self._conn.commit()
+
+    def _reader(self):
+        """This thread's read connection (WAL readers see the last committed state and never block)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA query_only = ON")
+            self._local.conn = conn
+        return conn
+
+    def count(self):
+        (count,) = self._reader().execute("SELECT COUNT(*) FROM docs").fetchone()
+        return count
+
+    def get_meta(self, key):
+        row = self._reader().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def _remove_postings(self, chunk_ids):
+        """Deletes the postings of chunks and lowers the document frequency of their terms. Caller holds the lock."""
+        for chunk_id in chunk_ids:
+            terms = [row[0] for row in self._conn.execute("SELECT term FROM postings WHERE chunk_id = ?", (chunk_id,))]
+            if not terms:
+                continue
+            self._conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", [(term,) for term in terms])
+            self._conn.execute("DELETE FROM postings WHERE chunk_id = ?", (chunk_id,))
+        self._conn.execute("DELETE FROM terms WHERE df <= 0")
+
+    def add_many(self, items):
+        """Indexes a list of (chunk_id, source_file, text). Existing chunk IDs are replaced."""
+        if not items:
+            return
+        with self._lock:
+            self._remove_postings([chunk_id for chunk_id, _, _ in items])
+            for chunk_id, source_file, text in items:
+                terms = Counter(tokenize(text))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO docs (chunk_id, source_file, length) VALUES (?, ?, ?)",
+                    (chunk_id, source_file, sum(terms.values())),
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in terms.items()],
+                )
+                self._conn.executemany(
+                    "INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1",
+                    [(term,) for term in terms],
+                )
+            self._conn.commit()
+
+    def access_tags(self):
+        """{tag: number of source files carrying it}."""
+        rows = self._reader().execute("SELECT tag, COUNT(*) FROM source_access GROUP BY tag").fetchall()
+        return dict(rows)
+
+    def set_source_access(self, source_file, tags):
+        """Replaces the access tags of a source file."""
+        with self._lock:
+            self._conn.execute("DELETE FROM source_access WHERE source_file = ?", (source_file,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO source_access (source_file, tag) VALUES (?, ?)",
+                [(source_file, tag) for tag in tags],
+            )
+            self._conn.commit()
+
+    def delete_source(self, source_file):
+        with self._lock:
+            self._conn.execute("DELETE FROM source_access WHERE source_file = ?", (source_file,))
+            chunk_ids = [row[0] for row in self._conn.execute("SELECT chunk_id FROM docs WHERE source_file = ?", (source_file,))]
+            self._remove_postings(chunk_ids)
+            self._conn.execute("DELETE FROM docs WHERE source_file = ?", (source_file,))
+            self._conn.commit()
+
+    def delete_ids(self, chunk_ids):
+        with self._lock:
+            self._remove_postings(chunk_ids)
+            self._conn.executemany("DELETE FROM docs WHERE chunk_id = ?", [(i,) for i in chunk_ids])
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM source_access")
+            self._conn.execute("DELETE FROM terms")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.commit()
+
+    def search(self, query_text, limit=10, tags=None):
+        """
+        Returns [(chunk_id, score)] sorted by BM25 score, best first.
+        With tags, only chunks of source files carrying one of them are scored. IDF and
+        the average length still come from the whole index, so a chunk scores the same
+        for every caller who may see it.
+        """
+        terms = set(tokenize(query_text))
+        if not terms:
+            return []
+
+        access_filter = ""
+        access_params = ()
+        if tags is not None:
+            if not tags:
+                return []
+            access_filter = (" AND d.source_file IN (SELECT source_file FROM source_access WHERE tag IN (%s))"
+                             % ",".join("?" * len(tags)))
+            access_params = tuple(tags)
+
+        conn = self._reader()
+        total_docs, avg_length = conn.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+        if not total_docs:
+            return []
+        avg_length = avg_length or 1.0
+
+        terms = list(terms)
+        document_frequencies = dict(conn.execute(
+            "SELECT term, df FROM terms WHERE term IN (%s)" % ",".join("?" * len(terms)), terms
+        ).fetchall())
+        if not document_frequencies:
+            return []
+        # Skip very common terms; if the query has nothing else, keep its rarest term
+        max_df = max(self.min_skip_df, int(total_docs * self.max_df_ratio))
+        selected = {term: df for term, df in document_frequencies.items() if df <= max_df}
+        if not selected:
+            rarest = min(document_frequencies, key=document_frequencies.get)
+            selected = {rarest: document_frequencies[rarest]}
+
+        scores = Counter()
+        for term, df in selected.items():
+            rows = conn.execute(
+                "SELECT p.chunk_id, p.tf, d.length FROM postings p JOIN docs d ON d.chunk_id = p.chunk_id "
+                "WHERE p.term = ?" + access_filter,
+                (term,) + access_params,
+            ).fetchall()
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            for chunk_id, tf, length in rows:
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / norm
+
+        return scores.most_common(limit)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses several ranked lists of IDs. Each ID scores sum(1 / (k + rank)) over the lists it appears in.
+    Returns [(id, score)] best first.
+    """
+    fused = Counter()
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            fused[item_id] += 1.0 / (k + rank)
+    return fused.most_common()
@@ -0,0 +1,94 @@
+import os
+import json
+from context_builder import assemble_context, CONTEXT_BUDGETS
+from document_access import viewer_tags
+from rag import RETRIEVAL_MODE, RERANK_ENABLED
+
+# Shared by the Flask chat view (app.py) and the asyncio serving mode (asgi.py)
+
+# Largest context_budget a request may ask for (estimated tokens)
+MAX_CONTEXT_BUDGET = int(os.getenv('CONTEXT_BUDGET_MAX', 16000))
+# Largest rerank candidate pool a request may ask for (chunks fetched from Chroma and BM25)
+MAX_RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES_MAX', 200))
+
+SYSTEM_PROMPT = "당신은 대학 입시를 돕는 유용한 도우미입니다. 다음 문맥을 사용하여 사용자의 질문에 답하세요. 만약 문맥에 정답이 없다면 일반적인 지식을 사용하되, 제공된 문서에서 나온 정보가 아님을 언급하세요. 모든 답변은 한국어로 작성해야 합니다."
+
+
+def int_option(data, name, default, low, high):
+    """An integer option of a request body, clamped to [low, high]. Raises ValueError if it is not an integer."""
+    value = data.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be an integer")
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    return min(max(value, low), high)
+
+
+def chat_options(data, identity=None):
+    """
+    Retrieval and generation options of a chat request body.
+    k (number of chunks), hybrid (BM25 + vector fusion) and rerank (cross-encoder over a
+    candidate pool) can be tuned per request. Reranked retrieval defaults to fewer, better chunks.
+    identity is the verified caller (None when anonymous); it decides which documents are retrieved.
+    Raises ValueError for malformed options (the views answer 400).
+    """
+    model = data.get('model', 'ollama')  # Default to ollama
+    # Unset options resolve to the server defaults here, so the answer cache scope of a request
+    # that leaves them out matches one that spells the same settings out
+    hybrid = (RETRIEVAL_MODE == 'hybrid') if data.get('hybrid') is None else bool(data.get('hybrid'))
+    rerank = RERANK_ENABLED if data.get('rerank') is None else bool(data.get('rerank'))
+    default_k = int(os.getenv('RERANK_TOP_N', 4)) if rerank else 10
+    k = int_option(data, 'k', default_k, 1, 50)
+    return {
+        "model": model,
+        "k": k,
+        "hybrid": hybrid,
+        "rerank": rerank,
+        # None keeps the server default (RERANK_CANDIDATES); the pool is never smaller than k
+        "candidates": int_option(data, 'candidates', None, k, max(k, MAX_RERANK_CANDIDATES)),
+        "budget": int_option(data, 'context_budget', CONTEXT_BUDGETS.get(model, CONTEXT_BUDGETS['ollama']),
+                             100, MAX_CONTEXT_BUDGET),
+        # "cache": false bypasses the semantic answer cache (no lookup, no store)
+        "use_cache": data.get('cache', True) is not False,
+        "tags": viewer_tags(identity),
+    }
+
+
+def cache_scope(options, collection_version):
+    """
+    Answer cache scope: a cached answer is only reused for the same model, corpus version and retrieval
+    settings, and for callers who may read the same documents (an answer can quote restricted chunks).
+    """
+    return (options['model'], collection_version, options['k'], options['hybrid'], options['rerank'],
+            options['candidates'], options['budget'], options['tags'])
+
+
+def build_context(rag_service, user_message, options):
+    """Retrieves chunks and packs them into the model's token budget. Returns (context_docs, report)."""
+    chunks = rag_service.retrieve(user_message, k=options['k'], hybrid=options['hybrid'],
+                                  rerank=options['rerank'], candidates=options['candidates'], tags=options['tags'])
+
+    # Drop near-duplicates, pack up to the model's token budget and merge overlapping neighbours
+    context_docs, context_report = assemble_context(chunks, options['budget'])
+    print(f"Context: {context_report['chunks_out']}/{context_report['chunks_in']} chunks, "
+          f"{context_report['tokens_after']} tokens ({context_report['tokens_saved']} saved, "
+          f"{context_report['tokens_dropped_for_budget']} over budget)")
+    return context_docs, context_report
+
+
+def build_prompt(context_docs, user_message, history=""):
+    """history is the conversation block (summary + recent turns) of a multi-turn chat, if any."""
+    context_text = "\n\n".join(context_docs)
+    history_text = f"{history}\n\n" if history else ""
+    return f"{SYSTEM_PROMPT}\n\nContext:\n{context_text}\n\n{history_text}User Question:\n{user_message}"
+
+
+def encode_event(event, use_sse=False):
+    """One streamed chat event, as an NDJSON line or a Server-Sent Event."""
+    if use_sse:
+        return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+    return json.dumps(event, ensure_ascii=False) + "\n"
@@ -0,0 +1,144 @@
+import os
+import re
+
+# Prompt budget (estimated tokens) for retrieved context, per backend.
+# llama3.2:1b runs with a small context window in Ollama; Gemini can take far more but bills per token.
+CONTEXT_BUDGETS = {
+    'ollama': int(os.getenv('CONTEXT_BUDGET_OLLAMA', 1500)),
+    'gemini': int(os.getenv('CONTEXT_BUDGET_GEMINI', 6000)),
+}
+DUPLICATE_THRESHOLD = 0.8  # Shingle Jaccard similarity above which two chunks count as the same text
+
+_HANGUL_RE = re.compile(r'[가-힣]')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def estimate_tokens(text):
+    """
+    Rough token count without loading a tokenizer.
+    Hangul syllables cost about one token each; other text about four characters per token.
+    """
+    hangul = len(_HANGUL_RE.findall(text))
+    return hangul + (len(text) - hangul + 3) // 4
+
+
+def _merge_overlap(first, second, probe=30):
+    """If second starts with a tail of first (the splitter's chunk_overlap), returns the merged text."""
+    head = second[:probe]
+    if len(head) < probe:
+        return None
+    idx = first.rfind(head)
+    while idx != -1:
+        tail = first[idx:]
+        if second.startswith(tail):
+            return first + second[len(tail):]
+        idx = first.rfind(head, 0, idx)
+    return None
+
+
+def _shingles(text, size=3):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _is_duplicate(a, b):
+    if a in b or b in a:
+        return True
+    sa, sb = _shingles(a), _shingles(b)
+    union = len(sa | sb)
+    return union > 0 and len(sa & sb) / union >= DUPLICATE_THRESHOLD
+
+
+def _merge_neighbours(texts):
+    """
+    Merges neighbouring chunks of the same file that share overlap text, in place.
+    The merged text keeps the better (earlier) rank. Returns the number of merges.
+    """
+    merged_count = 0
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(texts)):
+            for j in range(len(texts)):
+                if i == j or texts[i][1] != texts[j][1]:
+                    continue
+                merged = _merge_overlap(texts[i][0], texts[j][0])
+                if merged is not None:
+                    keep, drop = min(i, j), max(i, j)
+                    texts[keep] = (merged, texts[keep][1])
+                    del texts[drop]
+                    merged_count += 1
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged_count
+
+
+def _marginal_cost(text, source, packed):
+    """Tokens that adding a chunk costs: less than its own size when it overlaps an admitted neighbour."""
+    cost = estimate_tokens(text)
+    for kept, kept_source in packed:
+        if kept_source != source:
+            continue
+        merged = _merge_overlap(kept, text) or _merge_overlap(text, kept)
+        if merged is not None:
+            cost = min(cost, estimate_tokens(merged) - estimate_tokens(kept))
+    return cost
+
+
+def assemble_context(chunks, budget):
+    """
+    Turns ranked retrieval results into the context passed to the LLM:
+    1. drops near-duplicates (lower-ranked copy goes),
+    2. packs chunks in rank order until the token budget is used up; a chunk that overlaps
+       one already admitted only costs the text it adds,
+    3. merges the admitted neighbours of the same file that share overlap text.
+    Packing works per chunk, so a budget that is too small for a whole merged run still
+    keeps its best-ranked parts instead of skipping the run for lower-ranked chunks.
+    Returns (texts, report); tokens_saved counts what deduplication and merging removed,
+    tokens_dropped_for_budget what did not fit.
+    """
+    texts = [(chunk['content'], (chunk.get('metadata') or {}).get('source_file')) for chunk in chunks]
+    tokens_before = sum(estimate_tokens(t) for t, _ in texts)
+
+    # 1. Remove near-duplicates. Overlapping neighbours only share the splitter's overlap,
+    #    so they are not caught here; they are merged in step 3.
+    unique = []
+    for text, source in texts:
+        if any(_is_duplicate(text, kept) for kept, _ in unique):
+            continue
+        unique.append((text, source))
+    duplicates_removed = len(texts) - len(unique)
+    tokens_deduplicated = tokens_before - sum(estimate_tokens(t) for t, _ in unique)
+
+    # 2. Pack up to the budget, skipping chunks that do not fit
+    packed = []
+    used = 0
+    for text, source in unique:
+        cost = _marginal_cost(text, source, packed)
+        if used + cost > budget:
+            continue
+        packed.append((text, source))
+        used += cost
+    tokens_admitted = sum(estimate_tokens(t) for t, _ in packed)
+
+    # 3. Merge the admitted overlapping neighbours
+    merged_count = _merge_neighbours(packed)
+    tokens_after = sum(estimate_tokens(t) for t, _ in packed)
+
+    report = {
+        "chunks_in": len(chunks),
+        "chunks_out": len(packed),
+        "merged": merged_count,
+        "duplicates_removed": duplicates_removed,
+        "dropped_for_budget": len(unique) - len(packed) - merged_count,
+        "budget": budget,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_deduplicated + (tokens_admitted - tokens_after),
+        "tokens_dropped_for_budget": tokens_before - tokens_deduplicated - tokens_admitted,
+    }
+    return [text for text, _ in packed], report
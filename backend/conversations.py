@@ -0,0 +1,196 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from cache import TTLCache
+from context_builder import estimate_tokens
+from llm_client import LLMError
+
+REWRITE_PROMPT = "다음 대화를 참고하여 마지막 질문을 문서 검색에 사용할 수 있도록 앞선 대화 없이도 이해되는 하나의 질문으로 다시 써 주세요. 다시 쓴 질문만 출력하세요."
+SUMMARY_PROMPT = "다음은 지금까지의 대화 요약과 그 뒤에 이어진 대화입니다. 사용자의 목표, 언급된 과목·학교·전형 등 중요한 사실을 유지하여 5문장 이내의 한국어 요약으로 갱신하세요. 요약만 출력하세요."
+
+
+class Conversation:
+    """
+    One multi-turn chat. Turns that fall out of the recent window are folded into
+    `summary`; summarized_upto is the number of turns the summary already covers.
+    `owner` is the user ID of the caller who started it (None for anonymous callers).
+    """
+
+    def __init__(self, conversation_id, owner=None):
+        self.id = conversation_id
+        self.owner = owner
+        self.turns = []  # {"turn_id", "user", "assistant", "model", "created_at"}
+        self.summary = ""
+        self.summarized_upto = 0
+        self.next_turn_id = 1
+        self.lock = threading.Lock()
+
+    def reserve_turn_id(self):
+        with self.lock:
+            turn_id = self.next_turn_id
+            self.next_turn_id += 1
+            return turn_id
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "conversation_id": self.id,
+                "summary": self.summary,
+                "summarized_turns": self.summarized_upto,
+                "turns": list(self.turns),
+            }
+
+
+def conversation_owner(identity):
+    """Owner key of a caller identity (see auth_middleware.current_identity)."""
+    return identity['user_id'] if identity else None
+
+
+def format_turns(turns):
+    return "\n".join(f"User: {turn['user']}\nAssistant: {turn['assistant']}" for turn in turns)
+
+
+class ConversationStore:
+    """
+    Keeps conversations in memory only, matching the chat storage policy (history lives in the
+    browser session): a conversation expires after `ttl` seconds without a new turn.
+    Prompts carry the rolling summary plus up to `recent_turns` latest turns, packed into
+    `history_budget` estimated tokens, instead of the whole transcript.
+    `summarize(model, prompt)` produces summaries; it runs in a background thread after a turn.
+    Conversations are bound to the caller who created them: get and delete only find a
+    conversation for the same owner, so another user cannot read or extend it by its ID.
+    """
+
+    def __init__(self, summarize=None, ttl=3600, maxsize=10000, recent_turns=4, history_budget=800):
+        self.summarize = summarize
+        self.recent_turns = recent_turns
+        self.history_budget = history_budget
+        self._conversations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._summary_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-summary")
+
+    def create(self, owner=None):
+        conversation = Conversation(uuid.uuid4().hex, owner)
+        self._conversations.set(conversation.id, conversation)
+        return conversation
+
+    def get(self, conversation_id, owner=None):
+        """The conversation, or None if it does not exist, expired or belongs to someone else."""
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None or conversation.owner != owner:
+            return None
+        self._conversations.set(conversation_id, conversation)  # Sliding expiry
+        return conversation
+
+    def delete(self, conversation_id, owner=None):
+        """Returns False if there is no such conversation for this owner."""
+        if self.get(conversation_id, owner) is None:
+            return False
+        self._conversations.delete(conversation_id)
+        return True
+
+    def history(self, conversation):
+        """
+        (summary, turns, omitted) for the next prompt: every turn the summary does not cover
+        yet, newest first until the token budget is reached, plus the summary if it still fits.
+        Normally that is at most recent_turns turns; while a summary fold is pending or after
+        it failed, the older unsummarized turns are included too, as far as the budget allows.
+        omitted counts the unsummarized turns that did not fit.
+        """
+        with conversation.lock:
+            candidates = conversation.turns[conversation.summarized_upto:]
+            summary = conversation.summary
+
+        turns, used = [], 0
+        for turn in reversed(candidates):
+            cost = estimate_tokens(turn['user']) + estimate_tokens(turn['assistant'])
+            if turns and used + cost > self.history_budget:
+                break
+            turns.insert(0, turn)
+            used += cost
+        if summary and used + estimate_tokens(summary) > self.history_budget:
+            summary = ""
+        return summary, turns, len(candidates) - len(turns)
+
+    def history_text(self, conversation):
+        """History block for the answer prompt, or "" for the first turn."""
+        summary, turns, omitted = self.history(conversation)
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation:\n{summary}")
+        if omitted:
+            parts.append(f"({omitted} earlier turns are not shown.)")
+        if turns:
+            parts.append(f"Recent conversation:\n{format_turns(turns)}")
+        return "\n\n".join(parts)
+
+    def rewrite_prompt(self, conversation, message):
+        """Prompt that turns a follow-up into a standalone search query, or None when there is no history."""
+        history = self.history_text(conversation)
+        if not history:
+            return None
+        return f"{REWRITE_PROMPT}\n\n{history}\n\n마지막 질문:\n{message}"
+
+    @staticmethod
+    def fallback_query(conversation, message):
+        """Used when the rewrite call fails: the previous question gives the follow-up its subject."""
+        with conversation.lock:
+            previous = conversation.turns[-1]['user'] if conversation.turns else ""
+        return f"{previous} {message}".strip()
+
+    def add_turn(self, conversation, turn_id, message, answer, model):
+        with conversation.lock:
+            conversation.turns.append({
+                "turn_id": turn_id,
+                "user": message,
+                "assistant": answer,
+                "model": model,
+                "created_at": time.time(),
+            })
+            overflow = len(conversation.turns) - conversation.summarized_upto - self.recent_turns
+        self._conversations.set(conversation.id, conversation)
+        if overflow > 0 and self.summarize is not None:
+            self._summary_pool.submit(self._fold_into_summary, conversation, model)
+
+    def _fold_into_summary(self, conversation, model):
+        with conversation.lock:
+            upto = len(conversation.turns) - self.recent_turns
+            if upto <= conversation.summarized_upto:
+                return
+            evicted = conversation.turns[conversation.summarized_upto:upto]
+            summary = conversation.summary
+
+        prompt = f"{SUMMARY_PROMPT}\n\n요약:\n{summary or '(없음)'}\n\n이어진 대화:\n{format_turns(evicted)}"
+        try:
+            new_summary = self.summarize(model, prompt).strip()
+        except LLMError as e:
+            # The turns stay unsummarized: history() sends as many of them as the budget allows,
+            # and the next turn tries the fold again
+            print(f"Conversation summary failed, will retry after the next turn: {e}")
+            return
+
+        with conversation.lock:
+            conversation.summary = new_summary
+            conversation.summarized_upto = upto
+
+    def stats(self):
+        return self._conversations.stats()
+
+
+def init_conversation_store(app, router):
+    """Registers the conversation store; summaries are generated through the LLM router."""
+    store = ConversationStore(
+        summarize=lambda model, prompt: router.generate(model, prompt),
+        ttl=float(os.getenv('CONVERSATION_TTL', 3600)),
+        maxsize=int(os.getenv('CONVERSATION_MAX', 10000)),
+        recent_turns=int(os.getenv('CONVERSATION_RECENT_TURNS', 4)),
+        history_budget=int(os.getenv('CONVERSATION_HISTORY_BUDGET', 800)),
+    )
+    app.extensions['conversation_store'] = store
+    return store
+
+
+def get_conversation_store():
+    return current_app.extensions['conversation_store']
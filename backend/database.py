@@ -1,25 +1,209 @@
 import os
+import time
+import queue
+import threading
 import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
 
 load_dotenv()
 
+def _connect():
+    return mysql.connector.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD')
+    )
+
+
+class PooledConnection:
+    """
+    Wraps a pooled mysql.connector connection.
+    Behaves like the connection itself, except close() hands it back to the pool.
+    """
+
+    def __init__(self, pool, conn, created_at, overflow=False):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        self._overflow = overflow
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool._release(self._conn, self._created_at, self._overflow)
+
+
+class ConnectionPool:
+    """
+    Fixed-size MariaDB connection pool.
+    - pool_size: maximum number of open connections
+    - timeout: seconds to wait for a free connection before giving up
+    - recycle: connections older than this (seconds) are reopened
+    - health_check: connections idle longer than this (seconds) are pinged before reuse
+    Tracks wait time and connection churn for monitoring (see stats()).
+    A thread that already holds a connection never waits for a second one: with every
+    slot taken by such threads, each would wait on the others until the timeout. It gets
+    a short-lived overflow connection instead, closed (not pooled) when released.
+    """
+
+    def __init__(self, pool_size=10, timeout=10, recycle=3600, health_check=30):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check = health_check
+        self._idle = queue.LifoQueue()  # Most recently used first, so idle extras age out
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._held = threading.local()  # Connections the current thread has not released yet
+        self._metrics = {
+            "acquired": 0,
+            "overflow": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "in_use": 0,
+            "wait_time_total_ms": 0.0,
+            "wait_time_max_ms": 0.0,
+        }
+
+    def get_connection(self):
+        started = time.monotonic()
+        held = getattr(self._held, 'count', 0)
+        if held and not self._slots.acquire(blocking=False):
+            conn = _connect()
+            self._count("overflow")
+            self._held.count = held + 1
+            return PooledConnection(self, conn, time.monotonic(), overflow=True)
+        if not held and not self._slots.acquire(timeout=self.timeout):
+            self._count("timeouts")
+            raise Error(msg=f"Timed out after {self.timeout}s waiting for a database connection")
+
+        try:
+            conn, created_at = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._metrics["acquired"] += 1
+            self._metrics["in_use"] += 1
+            self._metrics["wait_time_total_ms"] += waited_ms
+            self._metrics["wait_time_max_ms"] = max(self._metrics["wait_time_max_ms"], waited_ms)
+        self._held.count = held + 1
+        return PooledConnection(self, conn, created_at)
+
+    def _checkout(self):
+        now = time.monotonic()
+        while True:
+            try:
+                conn, created_at, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            if now - created_at > self.recycle:
+                self._count("recycled")
+                self._discard(conn)
+                continue
+
+            if now - last_used > self.health_check:
+                try:
+                    conn.ping(reconnect=False)
+                except Error:
+                    self._count("health_check_failures")
+                    self._discard(conn)
+                    continue
+
+            return conn, created_at
+
+        conn = _connect()
+        self._count("created")
+        return conn, time.monotonic()
+
+    def _release(self, conn, created_at, overflow=False):
+        # Released by the thread that took it (connections are not handed between threads here)
+        self._held.count = max(getattr(self._held, 'count', 0) - 1, 0)
+        if overflow:
+            self._discard(conn)
+            return
+        try:
+            # End any open transaction so the next user does not read from a stale snapshot
+            conn.rollback()
+            self._idle.put((conn, created_at, time.monotonic()))
+        except Error:
+            self._discard(conn)
+        finally:
+            with self._lock:
+                self._metrics["in_use"] -= 1
+            self._slots.release()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def _count(self, key):
+        with self._lock:
+            self._metrics[key] += 1
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        acquired = metrics["acquired"]
+        metrics["wait_time_avg_ms"] = round(metrics["wait_time_total_ms"] / acquired, 3) if acquired else 0.0
+        metrics["idle"] = self._idle.qsize()
+        metrics["pool_size"] = self.pool_size
+        return metrics
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Returns the process-wide connection pool, or None when DB_POOL_SIZE=0 disables pooling."""
+    global _pool
+    pool_size = int(os.getenv('DB_POOL_SIZE', 10))
+    if pool_size <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    pool_size=pool_size,
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                    recycle=float(os.getenv('DB_POOL_RECYCLE', 3600)),
+                    health_check=float(os.getenv('DB_POOL_HEALTH_CHECK', 30))
+                )
+    return _pool
+
 def create_connection():
     """ create a database connection to the MariaDB database
-        specified by the config
+        specified by the config. Connections come from a pool;
+        calling close() returns them to it.
     """
     connection = None
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
+        pool = get_pool()
+        if pool is not None:
+            # Pooled connections are health-checked by the pool, no extra ping needed
+            return pool.get_connection()
+        connection = _connect()
         if connection.is_connected():
             return connection
     except Error as e:
         print(f"Error while connecting to MariaDB: {e}")
-    
+
     return connection
+
+def pool_stats():
+    """Connection pool metrics (wait times, churn, usage), or None when pooling is off."""
+    pool = get_pool()
+    return pool.stats() if pool else None
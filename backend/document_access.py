@@ -0,0 +1,94 @@
+import os
+import json
+
+# Per-document read access for retrieval.
+# A document's access rule is a dict of attribute lists, e.g. {"department": ["engineering"]};
+# a user may retrieve its chunks when they hold ANY of the listed (key, value) attributes.
+# No rule (None or {}) means every user, including anonymous chat, may retrieve it.
+#
+# Each (key, value) pair becomes a tag "key=value" (public documents get the tag "public").
+# Chroma metadata values cannot be lists, so every tag is stored on the chunk as its own
+# boolean key, e.g. "acl:department=engineering": True, and a viewer's tags turn into
+# a `where` filter that Chroma evaluates inside the nearest-neighbour query.
+ACL_PREFIX = 'acl:'
+PUBLIC_TAG = 'public'
+
+# Users holding this attribute retrieve from every document: they can read all chunks
+# through the document manager anyway. Format "key=value", empty to disable.
+ACL_BYPASS = os.getenv('RETRIEVAL_ACL_BYPASS', 'access_page=documents')
+# Set to 0 to turn retrieval filtering off (e.g. until migrate_document_access.py has run)
+ACL_ENABLED = os.getenv('RETRIEVAL_ACL_ENABLED', '1') == '1'
+
+
+def parse_access(value):
+    """
+    Normalizes an access rule from a form field, a JSON body or the documents table:
+    a JSON string or dict of {key: value or [values]}. Returns a dict of sorted lists,
+    or None for a public document. Raises ValueError for anything else.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            raise ValueError("Access rule must be a JSON object")
+    if not isinstance(value, dict):
+        raise ValueError("Access rule must be a JSON object")
+
+    access = {}
+    for key, values in value.items():
+        values = values if isinstance(values, list) else [values]
+        values = sorted({str(v) for v in values if v not in (None, '')})
+        if not key or '=' in key or not values:
+            raise ValueError(f"Invalid access attribute: {key}")
+        access[key] = values
+    return access or None
+
+
+def dump_access(access):
+    """Access rule as stored in documents.access_attributes (NULL for public documents)."""
+    return json.dumps(access, ensure_ascii=False, sort_keys=True) if access else None
+
+
+def access_tags(access):
+    """Tags a document grants."""
+    if not access:
+        return [PUBLIC_TAG]
+    return sorted(f"{key}={value}" for key, values in access.items() for value in values)
+
+
+def access_metadata(access):
+    """Chunk metadata entries for a document's access rule."""
+    return {ACL_PREFIX + tag: True for tag in access_tags(access)}
+
+
+def tags_from_metadata(metadata):
+    """Tags stored on a chunk (used to rebuild the keyword index from the vector store)."""
+    return sorted(key[len(ACL_PREFIX):] for key, value in (metadata or {}).items()
+                  if key.startswith(ACL_PREFIX) and value)
+
+
+def viewer_tags(identity):
+    """
+    Tags a caller may retrieve, as a sorted tuple (usable in cache keys), or None for
+    unrestricted retrieval. identity is auth_middleware's {"user_id", "username", "attributes"}
+    dict, or None for an anonymous caller, who only sees public documents.
+    """
+    if not ACL_ENABLED:
+        return None
+    attributes = (identity or {}).get('attributes') or {}
+    if ACL_BYPASS:
+        key, _, value = ACL_BYPASS.partition('=')
+        if value in attributes.get(key, []):
+            return None
+    tags = {PUBLIC_TAG}
+    tags.update(f"{key}={value}" for key, values in attributes.items() for value in values)
+    return tuple(sorted(tags))
+
+
+def chroma_where(tags):
+    """Chroma `where` filter matching chunks that carry any of the tags."""
+    conditions = [{ACL_PREFIX + tag: True} for tag in tags]
+    # Chroma rejects an $or with a single operand
+    return conditions[0] if len(conditions) == 1 else {"$or": conditions}
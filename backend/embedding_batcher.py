@@ -0,0 +1,91 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class QueryEmbeddingBatcher:
+    """
+    Micro-batches query embeddings from concurrent requests.
+    Each caller queues its text and blocks; a single worker thread collects queued
+    texts for up to max_wait seconds (or until max_batch_size) and embeds them in
+    one forward pass. On CPU a batch of 32 costs about as much as a few single
+    queries, so throughput under concurrent chat load goes up while a lone request
+    waits at most max_wait extra.
+    - embed_many: function mapping a list of texts to a list of vectors
+    - max_batch_size <= 1 disables batching (every call embeds directly)
+    """
+
+    def __init__(self, embed_many, max_batch_size=32, max_wait=0.005):
+        self.embed_many = embed_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+
+    def embed(self, text):
+        if self.max_batch_size <= 1:
+            self._record(1)
+            return self.embed_many([text])[0]
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _collect(self):
+        """Blocks for the first queued query, then gathers more until the batch is full or max_wait passes."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Identical questions asked at the same moment are embedded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.embed_many(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self._record(len(texts))
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+    def _record(self, size):
+        with self._stats_lock:
+            self.batches += 1
+            self.queries += size
+            self.largest_batch = max(self.largest_batch, size)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self.batches,
+                "queries": self.queries,
+                "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch
+            }
@@ -31,8 +31,25 @@ def init_db():
                 filename VARCHAR(255) NOT NULL,
                 filepath VARCHAR(512) NOT NULL,
                 uploaded_by INT,
+                content_hash CHAR(64),
+                access_attributes TEXT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (uploaded_by) REFERENCES users(id) ON DELETE SET NULL
+                FOREIGN KEY (uploaded_by) REFERENCES users(id) ON DELETE SET NULL,
+                INDEX idx_documents_content_hash (content_hash),
+                INDEX idx_documents_created_at (created_at, id)
+            )
+            """)
+
+            # 3. Token Revocations Table (see auth_tokens.RevocationList)
+            print("Creating token_revocations table...")
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS token_revocations (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                jti VARCHAR(64) NULL,
+                user_id INT NULL,
+                revoked_at DOUBLE NOT NULL,
+                expires_at DOUBLE NOT NULL,
+                INDEX idx_token_revocations_expires (expires_at)
             )
             """)
 
@@ -0,0 +1,415 @@
+import os
+import json
+import time
+import uuid
+import socket
+import hashlib
+import sqlite3
+import threading
+from flask import current_app
+from mysql.connector import Error
+from database import create_connection
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+class JobLost(Exception):
+    """The job was requeued and claimed elsewhere (our heartbeat went stale); stop working on it."""
+
+
+class JobQueue:
+    """
+    Local, persistent ingestion job queue.
+    Jobs and their progress events live in a SQLite file, so status survives
+    dropped client connections and restarts. Worker threads claim queued jobs
+    and record every progress update using the same {"status", "message"}
+    dicts that the NDJSON endpoints stream.
+
+    Several worker processes (gunicorn) may share the file. A job is claimed with a
+    conditional UPDATE, so exactly one process runs it, and the claiming process is
+    recorded as its owner. Owners refresh a heartbeat every heartbeat_interval seconds;
+    only RUNNING jobs whose heartbeat is older than stale_after (their process died)
+    are requeued and started over.
+    """
+
+    def __init__(self, rag_service, path="./jobs.sqlite", workers=1, poll_interval=0.5,
+                 heartbeat_interval=10, stale_after=60):
+        self.rag_service = rag_service
+        self.path = path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._handlers = {}
+
+        # Other processes write the same file: wait for their locks instead of failing
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT,
+                heartbeat REAL
+            )
+        """)
+        # Job files created before owners and heartbeats existed
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (("owner", "TEXT"), ("heartbeat", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            )
+        """)
+        self._conn.commit()
+        # Jobs that were running in a process that has died since are started over
+        self.requeue_stale()
+
+        self.register('ingest', _run_ingest)
+        self.register('reingest_all', _run_reingest_all)
+        self.register('bulk_ingest', _run_bulk_ingest)
+
+    def register(self, job_type, handler):
+        """handler(rag_service, params) must be a generator of progress dicts."""
+        self._handlers[job_type] = handler
+
+    def start(self):
+        """Starts the worker and heartbeat threads once (on the first submit, or at startup when jobs are queued)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            t = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def has_queued(self):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM jobs WHERE status = ? LIMIT 1", (QUEUED,)).fetchone()
+        return row is not None
+
+    def requeue_stale(self):
+        """Requeues RUNNING jobs whose owner stopped sending heartbeats. Returns how many."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? "
+                "WHERE status = ? AND (heartbeat IS NULL OR heartbeat < ?)",
+                (QUEUED, time.time(), RUNNING, time.time() - self.stale_after),
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            print(f"Requeued {cursor.rowcount} job(s) left running by a dead worker")
+        return cursor.rowcount
+
+    def submit(self, job_type, params):
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, type, params, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, json.dumps(params), QUEUED, now, now),
+            )
+            self._conn.commit()
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def complete(self, job_type, events):
+        """
+        Records a job that is already finished, e.g. an upload skipped as a duplicate, so the
+        client gets the same job handle and event stream as for real work. Returns its ID.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        error = events[-1].get('message') if events and events[-1].get('status') == 'error' else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, type, params, status, progress, error, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, "{}", FAILED if error else SUCCEEDED, json.dumps(events[-1]) if events else None, error, now, now),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_events (job_id, seq, event) VALUES (?, ?, ?)",
+                [(job_id, seq, json.dumps(event)) for seq, event in enumerate(events, start=1)],
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row:
+                return None
+            (event_count,) = self._conn.execute("SELECT COUNT(*) FROM job_events WHERE job_id = ?", (job_id,)).fetchone()
+        return _job_to_dict(row, event_count)
+
+    def list(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [_job_to_dict(row) for row in rows]
+
+    def events(self, job_id, after=0):
+        """Returns [(seq, event)] recorded after the given sequence number."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after),
+            ).fetchall()
+        return [(row['seq'], json.loads(row['event'])) for row in rows]
+
+    def stream(self, job_id, after=0):
+        """Yields events as they are recorded until the job finishes."""
+        while True:
+            # Read the status first so no events written just before completion are missed
+            job = self.get(job_id)
+            for seq, event in self.events(job_id, after):
+                after = seq
+                yield event
+            if job is None or job['status'] in FINISHED_STATES:
+                return
+            time.sleep(self.poll_interval)
+
+    def _claim(self):
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 10", (QUEUED,)
+            ).fetchall()
+            for candidate in candidates:
+                now = time.time()
+                # Only one process can move a job out of QUEUED; losing the race just means trying the next
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (RUNNING, self.owner, now, now, candidate['id'], QUEUED),
+                )
+                if cursor.rowcount != 1:
+                    self._conn.commit()
+                    continue
+                # Restarted jobs replay their events from scratch
+                self._conn.execute("DELETE FROM job_events WHERE job_id = ?", (candidate['id'],))
+                self._conn.commit()
+                return self._conn.execute("SELECT * FROM jobs WHERE id = ?", (candidate['id'],)).fetchone()
+            return None
+
+    def _record(self, job_id, seq, event):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (json.dumps(event), time.time(), job_id, self.owner)
+            )
+            if cursor.rowcount != 1:
+                self._conn.rollback()
+                raise JobLost(job_id)
+            self._conn.execute(
+                "INSERT INTO job_events (job_id, seq, event) VALUES (?, ?, ?)", (job_id, seq, json.dumps(event))
+            )
+            self._conn.commit()
+
+    def _finish(self, job_id, status, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (status, error, time.time(), job_id, self.owner)
+            )
+            self._conn.commit()
+
+    def _heartbeat_loop(self):
+        while True:
+            try:
+                with self._lock:
+                    self._conn.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = ?",
+                                       (time.time(), self.owner, RUNNING))
+                    self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Job heartbeat failed: {e}")
+            time.sleep(self.heartbeat_interval)
+
+    def _worker_loop(self):
+        # Worker threads are never restarted, so no error may end this loop
+        while True:
+            try:
+                if not self._run_next():
+                    # Idle: pick up jobs orphaned by workers that died after this process started
+                    self.requeue_stale()
+                    self._wakeup.wait(timeout=self.poll_interval * 10)
+                    self._wakeup.clear()
+            except Exception as e:
+                print(f"Job worker error: {e}")
+                time.sleep(self.poll_interval)
+
+    def _run_next(self):
+        """Claims and runs one job. Returns False when nothing was queued."""
+        row = self._claim()
+        if row is None:
+            return False
+
+        job_id = row['id']
+        handler = self._handlers.get(row['type'])
+        seq = 0
+        error = None
+        try:
+            for event in handler(self.rag_service, json.loads(row['params'])):
+                seq += 1
+                self._record(job_id, seq, event)
+                # A job fails if its final event is an error; per-file errors in a
+                # multi-file job are reported but do not fail the whole job.
+                error = event.get('message') if event.get('status') == 'error' else None
+        except JobLost:
+            print(f"Job {job_id} was taken over by another worker, stopping here")
+            return True
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            error = str(e)
+            seq += 1
+            try:
+                self._record(job_id, seq, {"status": "error", "message": error})
+            except JobLost:
+                print(f"Job {job_id} was taken over by another worker, stopping here")
+                return True
+            except sqlite3.Error as record_error:
+                # The job is still marked failed below; only its last event is missing
+                print(f"Could not record the failure of job {job_id}: {record_error}")
+
+        self._finish(job_id, FAILED if error else SUCCEEDED, error)
+        return True
+
+
+def _job_to_dict(row, event_count=None):
+    job = {
+        "id": row['id'],
+        "type": row['type'],
+        "status": row['status'],
+        "progress": json.loads(row['progress']) if row['progress'] else None,
+        "error": row['error'],
+        "created_at": row['created_at'],
+        "updated_at": row['updated_at'],
+    }
+    if event_count is not None:
+        job['event_count'] = event_count
+    return job
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _confirm_content_hash(filepath, content_hash):
+    """
+    Marks the document rows of an uploaded file as indexed with content_hash, which makes
+    later uploads of the same bytes skip ingestion. Only done after a successful ingest,
+    and only if the file on disk still has those bytes (a newer upload may have replaced it).
+    """
+    try:
+        if file_sha256(filepath) != content_hash:
+            return
+    except OSError:
+        return
+    conn = create_connection()
+    if not conn:
+        print(f"Could not record the content hash of {filepath} (DB connection failed)")
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE documents SET content_hash = %s WHERE filepath = %s", (content_hash, filepath))
+        conn.commit()
+    except Error as e:
+        print(f"Could not record the content hash of {filepath}: {e}")
+    finally:
+        conn.close()
+
+
+def _run_ingest(rag_service, params):
+    if params.get('start_message'):
+        yield {"status": "info", "message": params['start_message']}
+    final = None
+    for update in rag_service.ingest_file(
+        params['filepath'], chunk_size=params['chunk_size'], chunk_overlap=params['chunk_overlap'],
+        batch_size=params.get('batch_size'), dry_run=params.get('dry_run', False), access=params.get('access')
+    ):
+        final = update
+        yield update
+    if params.get('content_hash') and final and final['status'] == 'success':
+        _confirm_content_hash(params['filepath'], params['content_hash'])
+
+
+def _run_reingest_all(rag_service, params):
+    documents = params['documents']
+    total_docs = len(documents)
+    for idx, doc in enumerate(documents):
+        yield {"status": "info", "message": f"[{idx+1}/{total_docs}] Processing {doc['filename']}..."}
+        for update in rag_service.ingest_file(doc['filepath'], chunk_size=params['chunk_size'], chunk_overlap=params['chunk_overlap'],
+                                              batch_size=params.get('batch_size'), access=doc.get('access')):
+            # Prefix update messages to indicate which file is being processed
+            if update['status'] == 'info':
+                update['message'] = f"[{doc['filename']}] {update['message']}"
+            yield update
+
+    yield {"status": "success", "message": f"Completed re-ingestion of {total_docs} documents."}
+
+
+def _run_bulk_ingest(rag_service, params):
+    for skipped in params.get('skipped', []):
+        yield {"status": "info", "message": f"[{skipped['filename']}] {skipped['reason']}. Skipped."}
+    documents = {os.path.basename(doc['filepath']): doc for doc in params['documents']}
+    for update in rag_service.ingest_files(
+        [doc['filepath'] for doc in params['documents']],
+        concurrency=params.get('concurrency'),
+        chunk_size=params['chunk_size'], chunk_overlap=params['chunk_overlap'],
+        batch_size=params.get('batch_size'), access=params.get('access')
+    ):
+        # A file's own final event is tagged with 'file'; per-file success confirms its hash
+        doc = documents.get(update.get('file'))
+        if doc and doc.get('content_hash') and update['status'] == 'success':
+            _confirm_content_hash(doc['filepath'], doc['content_hash'])
+        yield update
+
+
+def init_job_queue(app, rag_service):
+    """
+    Registers the shared JobQueue on the Flask app. Workers start on the first submit,
+    or right away when queued (or requeued) jobs are waiting from before the restart.
+    """
+    queue = JobQueue(
+        rag_service,
+        path=os.getenv('JOB_DB_PATH', './jobs.sqlite'),
+        workers=int(os.getenv('JOB_WORKERS', 1)),
+        heartbeat_interval=float(os.getenv('JOB_HEARTBEAT_INTERVAL', 10)),
+        stale_after=float(os.getenv('JOB_STALE_AFTER', 60)),
+    )
+    app.extensions['job_queue'] = queue
+    if queue.has_queued():
+        queue.start()
+    return queue
+
+
+def get_job_queue():
+    """Returns the JobQueue registered on the current Flask app."""
+    return current_app.extensions['job_queue']
@@ -0,0 +1,221 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import current_app
+
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+OLLAMA_MODEL = "llama3.2:1b"
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash"
+GEMINI_KEY_PATHS = [
+    # ../env/gemini.key (relative to backend folder), then the deployment location
+    '../env/gemini.key',
+    '/home/judgejack/working_space/studying_vibe/env/gemini.key',
+]
+
+
+class LLMError(Exception):
+    """Raised when an LLM backend fails. status_code is passed through to the client when known."""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMBusyError(LLMError):
+    """
+    Raised when every concurrency slot of a backend stays busy for longer than acquire_timeout,
+    or right away for a call made with wait=False.
+    """
+
+    def __init__(self, message):
+        super().__init__(message, status_code=503)
+
+
+class LLMClient:
+    """
+    HTTP client for one LLM backend.
+    Keeps a pooled keep-alive session, applies connect/read timeouts, retries
+    connection errors and 429/5xx responses with exponential backoff, and caps
+    the number of concurrent calls so a hung backend cannot take every worker thread.
+    """
+
+    def __init__(self, name, base_url, max_concurrency=4, connect_timeout=3.0, read_timeout=120.0,
+                 retries=2, backoff_factor=0.5, acquire_timeout=30.0):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.acquire_timeout = acquire_timeout
+        # Public so the asyncio clients (async_llm_client) can share this backend's limit
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # A slow generation is not retried, the read timeout already bounds it
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @contextmanager
+    def post(self, path, stream=False, wait=True, **kwargs):
+        """
+        POSTs to base_url + path while holding a concurrency slot. Yields the response.
+        With wait=False a call that finds no free slot fails at once instead of queueing.
+        """
+        acquired = self.slots.acquire(timeout=self.acquire_timeout) if wait else self.slots.acquire(blocking=False)
+        if not acquired:
+            raise LLMBusyError(f"{self.name} is busy, try again later")
+        try:
+            response = self.session.post(self.base_url + path, timeout=self.timeout, stream=stream, **kwargs)
+            try:
+                yield response
+            finally:
+                response.close()
+        finally:
+            self.slots.release()
+
+
+def load_gemini_key(key_paths):
+    """Reads the Gemini API key from the first existing path. Raises ValueError with a user-facing message if missing."""
+    key_path = next((p for p in key_paths if os.path.exists(p)), None)
+    if not key_path:
+        raise ValueError("Gemini API key file not found at studying_vibe/env/gemini.key")
+    with open(key_path, 'r') as f:
+        api_key = f.read().strip()
+    if not api_key:
+        raise ValueError("Gemini API key is empty")
+    return api_key
+
+
+def gemini_payload(prompt):
+    return {"contents": [{"parts": [{"text": prompt}]}]}
+
+
+def gemini_text(result):
+    """Extracts the answer text from a generateContent response."""
+    try:
+        return result['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError):
+        raise LLMError(f"Unexpected response format from Gemini: {result}")
+
+
+def gemini_stream_texts(line):
+    """Yields the text parts of one streamGenerateContent SSE line (other lines yield nothing)."""
+    if not line.startswith('data:'):
+        return
+    chunk = json.loads(line[len('data:'):])
+    for candidate in chunk.get('candidates', [])[:1]:
+        for part in candidate.get('content', {}).get('parts', []):
+            if part.get('text'):
+                yield part['text']
+
+
+class OllamaClient(LLMClient):
+    def __init__(self, model=OLLAMA_MODEL, **kwargs):
+        super().__init__('ollama', OLLAMA_URL, **kwargs)
+        self.model = model
+
+    def generate(self, prompt, wait=True):
+        """Returns the full Ollama generate response (dict with 'response', 'done', ...)."""
+        try:
+            with self.post('/api/generate', json={"model": self.model, "prompt": prompt, "stream": False}, wait=wait) as response:
+                if response.status_code != 200:
+                    raise LLMError(f"Failed to get response from Ollama. Status: {response.status_code}, Response: {response.text}")
+                return response.json()
+        except requests.exceptions.RequestException as e:
+            raise LLMError(f"Ollama connection failed: {str(e)}")
+
+    def stream(self, prompt, wait=True):
+        """Yields response tokens from Ollama's streaming generate API."""
+        try:
+            with self.post('/api/generate', stream=True, json={"model": self.model, "prompt": prompt, "stream": True}, wait=wait) as response:
+                if response.status_code != 200:
+                    raise LLMError(f"Failed to get response from Ollama. Status: {response.status_code}, Response: {response.text}")
+                # Ollama streams one JSON object per line
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('response'):
+                        yield chunk['response']
+                    if chunk.get('done'):
+                        break
+        except requests.exceptions.RequestException as e:
+            raise LLMError(f"Ollama connection failed: {str(e)}")
+
+
+class GeminiClient(LLMClient):
+    def __init__(self, key_paths=None, **kwargs):
+        super().__init__('gemini', GEMINI_URL, **kwargs)
+        self.key_paths = key_paths or GEMINI_KEY_PATHS
+        self._api_key = None
+        self._key_lock = threading.Lock()
+
+    @property
+    def api_key(self):
+        """The API key, read from disk once. Raises ValueError with a user-facing message if missing."""
+        if self._api_key is None:
+            with self._key_lock:
+                if self._api_key is None:
+                    self._api_key = load_gemini_key(self.key_paths)
+        return self._api_key
+
+    def _headers(self):
+        return {'Content-Type': 'application/json', 'x-goog-api-key': self.api_key}
+
+    def generate(self, prompt, wait=True):
+        """Returns the generated text."""
+        try:
+            with self.post(':generateContent', json=gemini_payload(prompt), headers=self._headers(), wait=wait) as response:
+                if response.status_code != 200:
+                    raise LLMError(f"Gemini API Error: {response.status_code} {response.text}", response.status_code)
+                result = response.json()
+        except requests.exceptions.RequestException as e:
+            raise LLMError(f"Gemini integration failed: {str(e)}")
+
+        # Extract text from Gemini response structure
+        return gemini_text(result)
+
+    def stream(self, prompt, wait=True):
+        """Yields response tokens from Gemini's streamGenerateContent API (SSE)."""
+        try:
+            with self.post(':streamGenerateContent?alt=sse', stream=True, json=gemini_payload(prompt), headers=self._headers(),
+                           wait=wait) as response:
+                if response.status_code != 200:
+                    raise LLMError(f"Gemini API Error: {response.status_code} {response.text}", response.status_code)
+                for line in response.iter_lines():
+                    # Decode ourselves: without a charset requests would assume Latin-1 and break Korean text
+                    yield from gemini_stream_texts(line.decode('utf-8').strip())
+        except requests.exceptions.RequestException as e:
+            raise LLMError(f"Gemini integration failed: {str(e)}")
+
+
+def init_llm_clients(app):
+    """Registers one pooled client per LLM backend on the Flask app."""
+    common = {
+        "connect_timeout": float(os.getenv('LLM_CONNECT_TIMEOUT', 3)),
+        "read_timeout": float(os.getenv('LLM_READ_TIMEOUT', 120)),
+        "retries": int(os.getenv('LLM_RETRIES', 2)),
+    }
+    clients = {
+        'ollama': OllamaClient(max_concurrency=int(os.getenv('OLLAMA_MAX_CONCURRENCY', 2)), **common),
+        'gemini': GeminiClient(max_concurrency=int(os.getenv('GEMINI_MAX_CONCURRENCY', 8)), **common),
+    }
+    app.extensions['llm_clients'] = clients
+    return clients
+
+
+def get_llm_client(name):
+    """Returns the registered client for 'ollama' or 'gemini'."""
+    return current_app.extensions['llm_clients'][name]
@@ -0,0 +1,428 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app
+from llm_client import LLMError, LLMBusyError
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is everything slower
+HISTOGRAM_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# Where a request goes when its backend fails or is unhealthy
+FALLBACKS = {
+    'ollama': ['gemini'],
+    'gemini': ['ollama'],
+}
+
+
+class BackendStats:
+    """
+    Latency and error tracking for one LLM backend.
+    Keeps a cumulative histogram for monitoring, plus a sliding window of recent
+    calls that drives routing decisions (error rate, p95 for hedging).
+    """
+
+    def __init__(self, name, window=200):
+        self.name = name
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.latency_total_ms = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self._recent_latencies = deque(maxlen=window)  # Successful calls only
+        self._recent_outcomes = deque(maxlen=window)   # True = success
+
+    def record(self, latency_ms, ok):
+        with self._lock:
+            self.requests += 1
+            self._recent_outcomes.append(ok)
+            if not ok:
+                self.errors += 1
+                return
+            self.latency_total_ms += latency_ms
+            self._recent_latencies.append(latency_ms)
+            bucket = next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if latency_ms <= bound), len(HISTOGRAM_BUCKETS_MS))
+            self.histogram[bucket] += 1
+
+    def error_rate(self):
+        with self._lock:
+            if not self._recent_outcomes:
+                return 0.0
+            return self._recent_outcomes.count(False) / len(self._recent_outcomes)
+
+    def percentile(self, q, min_samples=1):
+        """q-th percentile (0-100) of recent successful latencies in ms, or None with too few samples."""
+        with self._lock:
+            latencies = sorted(self._recent_latencies)
+        if len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q / 100))]
+
+    def healthy(self, max_error_rate, min_samples):
+        with self._lock:
+            samples = len(self._recent_outcomes)
+        return samples < min_samples or self.error_rate() <= max_error_rate
+
+    def snapshot(self):
+        with self._lock:
+            successes = self.requests - self.errors
+            buckets = [f"le_{bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + ["inf"]
+            snapshot = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "latency_avg_ms": round(self.latency_total_ms / successes, 1) if successes else None,
+                "histogram": dict(zip(buckets, self.histogram)),
+            }
+        snapshot["recent_error_rate"] = round(self.error_rate(), 3)
+        for name, q in (("p50_ms", 50), ("p95_ms", 95)):
+            value = self.percentile(q)
+            snapshot[name] = round(value, 1) if value is not None else None
+        return snapshot
+
+
+class RouterPolicy:
+    """
+    Backend choice shared by the Flask (LLMRouter) and asyncio (AsyncLLMRouter) routers:
+    - the requested backend goes first, its fallbacks after it
+    - a backend whose recent error rate is above max_error_rate is moved to the back
+    - hedged requests start the next backend once the first exceeds its p95 latency
+    """
+
+    def __init__(self, backends, stats=None, max_error_rate=0.5, min_samples=10, hedge_default_ms=8000, hedge_min_samples=20):
+        self.stats = stats or {name: BackendStats(name) for name in backends}
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.hedge_default_ms = hedge_default_ms
+        self.hedge_min_samples = hedge_min_samples
+
+    @staticmethod
+    def primary(model):
+        # Anything but 'gemini' means the default local model, as before routing existed
+        return 'gemini' if model == 'gemini' else 'ollama'
+
+    def order(self, model, fallback=True):
+        primary = self.primary(model)
+        candidates = [primary] + (FALLBACKS.get(primary, []) if fallback else [])
+        # Unhealthy backends are tried last rather than skipped, so a request always gets a try
+        healthy = [name for name in candidates if self.stats[name].healthy(self.max_error_rate, self.min_samples)]
+        return healthy + [name for name in candidates if name not in healthy]
+
+    def hedge_deadline(self, name):
+        """Seconds to wait for `name` before hedging: its recent p95, or hedge_default_ms until there is enough data."""
+        p95 = self.stats[name].percentile(95, min_samples=self.hedge_min_samples)
+        return (p95 if p95 is not None else self.hedge_default_ms) / 1000
+
+    def snapshot(self):
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+
+def _text(result):
+    # Ollama returns its whole response dict, Gemini the text
+    return result.get('response', '') if isinstance(result, dict) else result
+
+
+def _rounds(order):
+    """
+    (backends, wait) rounds for a call: every backend is first tried only if it has a free slot,
+    so a saturated primary sends the request straight to its fallback instead of queueing;
+    the ones that were busy are then tried again, this time waiting for a slot.
+    """
+    return [False, True] if len(order) > 1 else [True]
+
+
+class LLMRouter(RouterPolicy):
+    """
+    Routes chat generations over the registered LLM clients (see RouterPolicy).
+    `info` dicts passed in are filled with the backend that answered, whether that was
+    a fallback, and whether a hedged request was sent.
+    """
+
+    def __init__(self, clients, hedge_workers=8, **kwargs):
+        super().__init__(clients.keys(), **kwargs)
+        self.clients = clients
+        # Hedged calls run here (size with LLM_HEDGE_WORKERS); losing ones run to completion
+        # in the background and their latency is still recorded
+        self._hedge_pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="llm-hedge")
+
+    def _call(self, name, prompt, wait=True):
+        started = time.monotonic()
+        try:
+            text = _text(self.clients[name].generate(prompt, wait=wait))
+        except LLMBusyError:
+            if not wait:
+                raise  # No slot free right now says nothing about the backend's health
+            self.stats[name].record((time.monotonic() - started) * 1000, ok=False)
+            raise
+        except (LLMError, ValueError) as e:
+            self.stats[name].record((time.monotonic() - started) * 1000, ok=False)
+            print(f"LLM backend {name} failed: {e}")
+            raise e if isinstance(e, LLMError) else LLMError(str(e))
+        self.stats[name].record((time.monotonic() - started) * 1000, ok=True)
+        return text
+
+    def _sequential(self, order, prompt, info):
+        """Tries the backends one after another (see _rounds). Raises the last LLMError when all failed."""
+        last_error = None
+        for wait in _rounds(order):
+            busy = []
+            for name in order:
+                try:
+                    text = self._call(name, prompt, wait=wait)
+                except LLMBusyError as e:
+                    busy.append(name)
+                    last_error = e
+                    continue
+                except LLMError as e:
+                    last_error = e
+                    continue
+                info.update(backend=name, fallback=name != info['requested'])
+                return text
+            order = busy
+        raise last_error
+
+    def generate(self, model, prompt, fallback=True, hedge=False, info=None):
+        """Returns the generated text. Raises the last LLMError when every backend failed."""
+        info = info if info is not None else {}
+        order = self.order(model, fallback)
+        info.update(requested=self.primary(model), hedged=False)
+        if not hedge or len(order) < 2:
+            return self._sequential(order, prompt, info)
+        return self._hedged(order, prompt, info)
+
+    def _hedged(self, order, prompt, info):
+        """
+        The primary runs in the hedge pool while the caller waits on it; once it exceeds its p95
+        deadline the remaining backends are started there too and the first answer wins.
+        The primary is tried without waiting for a slot, so a saturated primary goes straight
+        to the fallbacks. A losing call runs to completion in the background, so the slow
+        samples hedging exists for still reach the latency stats.
+        """
+        primary, backups = order[0], order[1:]
+        backup_info = {"requested": info['requested']}
+        primary_future = self._hedge_pool.submit(self._call, primary, prompt, False)
+        done, pending = wait({primary_future}, timeout=self.hedge_deadline(primary))
+        if done:
+            try:
+                text = primary_future.result()
+            except LLMBusyError:
+                return self._sequential(backups + [primary], prompt, info)
+            except LLMError:
+                return self._sequential(backups, prompt, info)
+            info.update(backend=primary, fallback=False)
+            return text
+
+        # Still nothing after the p95 deadline: race the backups
+        info['hedged'] = True
+        pending.add(self._hedge_pool.submit(self._sequential, backups, prompt, backup_info))
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    text = future.result()
+                except LLMError as e:
+                    last_error = e
+                    continue
+                if future is primary_future:
+                    info.update(backend=primary, fallback=False)
+                else:
+                    info.update(backup_info)
+                return text
+        raise last_error
+
+    def stream(self, model, prompt, fallback=True, info=None):
+        """
+        Yields tokens. Falls back to the next backend only while nothing has been sent yet;
+        once tokens reached the client, a failure is raised as is.
+        Streams are never hedged: the client reads the first backend's tokens as they arrive,
+        and switching to a second backend would mean either discarding tokens it already has or
+        mixing two answers. A backend without a free slot is skipped as in generate (_rounds).
+        """
+        info = info if info is not None else {}
+        order = self.order(model, fallback)
+        info.update(requested=self.primary(model), hedged=False)
+        last_error = None
+        for wait in _rounds(order):
+            busy = []
+            for name in order:
+                started = time.monotonic()
+                sent = False
+                try:
+                    for token in self.clients[name].stream(prompt, wait=wait):
+                        if not sent:
+                            sent = True
+                            info.update(backend=name, fallback=name != info['requested'])
+                        yield token
+                except LLMBusyError as e:
+                    if wait:
+                        self.stats[name].record((time.monotonic() - started) * 1000, ok=False)
+                    else:
+                        busy.append(name)
+                    last_error = e
+                    continue
+                except (LLMError, ValueError) as e:
+                    self.stats[name].record((time.monotonic() - started) * 1000, ok=False)
+                    print(f"LLM backend {name} failed: {e}")
+                    if sent:
+                        raise e if isinstance(e, LLMError) else LLMError(str(e))
+                    last_error = e if isinstance(e, LLMError) else LLMError(str(e))
+                    continue
+                self.stats[name].record((time.monotonic() - started) * 1000, ok=True)
+                info.setdefault('backend', name)
+                info.setdefault('fallback', name != info['requested'])
+                return
+            order = busy
+        raise last_error
+
+
+class AsyncLLMRouter(RouterPolicy):
+    """asyncio version of LLMRouter for asgi.py. Pass the Flask router's stats to share one set of metrics."""
+
+    def __init__(self, clients, **kwargs):
+        super().__init__(clients.keys(), **kwargs)
+        self.clients = clients
+
+    async def _call(self, name, prompt, wait=True):
+        started = time.monotonic()
+        try:
+            text = _text(await self.clients[name].generate(prompt, wait=wait))
+        except LLMBusyError:
+            if not wait:
+                raise
+            self.stats[name].record((time.monotonic() - started) * 1000, ok=False)
+            raise
+        except (LLMError, ValueError) as e:
+            self.stats[name].record((time.monotonic() - started) * 1000, ok=False)
+            print(f"LLM backend {name} failed: {e}")
+            raise e if isinstance(e, LLMError) else LLMError(str(e))
+        self.stats[name].record((time.monotonic() - started) * 1000, ok=True)
+        return text
+
+    async def _sequential(self, order, prompt, info):
+        last_error = None
+        for wait in _rounds(order):
+            busy = []
+            for name in order:
+                try:
+                    text = await self._call(name, prompt, wait=wait)
+                except LLMBusyError as e:
+                    busy.append(name)
+                    last_error = e
+                    continue
+                except LLMError as e:
+                    last_error = e
+                    continue
+                info.update(backend=name, fallback=name != info['requested'])
+                return text
+            order = busy
+        raise last_error
+
+    async def generate(self, model, prompt, fallback=True, hedge=False, info=None):
+        """
+        Same routing as LLMRouter.generate. Hedging needs no thread here: the primary and
+        the backup are tasks on the event loop, and the losing one is cancelled.
+        """
+        info = info if info is not None else {}
+        order = self.order(model, fallback)
+        info.update(requested=self.primary(model), hedged=False)
+        if not hedge or len(order) < 2:
+            return await self._sequential(order, prompt, info)
+
+        primary, backups = order[0], order[1:]
+        backup_info = {"requested": info['requested']}
+        primary_task = asyncio.ensure_future(self._call(primary, prompt, wait=False))
+        pending = {primary_task}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_deadline(primary))
+            if done:
+                try:
+                    text = primary_task.result()
+                except LLMBusyError:
+                    return await self._sequential(backups + [primary], prompt, info)
+                except LLMError:
+                    return await self._sequential(backups, prompt, info)
+                info.update(backend=primary, fallback=False)
+                return text
+
+            # Still nothing after the p95 deadline: race the backups
+            info['hedged'] = True
+            backup_task = asyncio.ensure_future(self._sequential(backups, prompt, backup_info))
+            pending.add(backup_task)
+            last_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        text = task.result()
+                    except LLMError as e:
+                        last_error = e
+                        continue
+                    if task is primary_task:
+                        info.update(backend=primary, fallback=False)
+                    else:
+                        info.update(backup_info)
+                    return text
+            raise last_error
+        finally:
+            # Unlike threads, the losing call can simply be cancelled
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, model, prompt, fallback=True, info=None):
+        """Same routing as LLMRouter.stream; never hedged (see there)."""
+        info = info if info is not None else {}
+        order = self.order(model, fallback)
+        info.update(requested=self.primary(model), hedged=False)
+        last_error = None
+        for wait in _rounds(order):
+            busy = []
+            for name in order:
+                started = time.monotonic()
+                sent = False
+                try:
+                    async for token in self.clients[name].stream(prompt, wait=wait):
+                        if not sent:
+                            sent = True
+                            info.update(backend=name, fallback=name != info['requested'])
+                        yield token
+                except LLMBusyError as e:
+                    if wait:
+                        self.stats[name].record((time.monotonic() - started) * 1000, ok=False)
+                    else:
+                        busy.append(name)
+                    last_error = e
+                    continue
+                except (LLMError, ValueError) as e:
+                    self.stats[name].record((time.monotonic() - started) * 1000, ok=False)
+                    print(f"LLM backend {name} failed: {e}")
+                    if sent:
+                        raise e if isinstance(e, LLMError) else LLMError(str(e))
+                    last_error = e if isinstance(e, LLMError) else LLMError(str(e))
+                    continue
+                self.stats[name].record((time.monotonic() - started) * 1000, ok=True)
+                info.setdefault('backend', name)
+                info.setdefault('fallback', name != info['requested'])
+                return
+            order = busy
+        raise last_error
+
+
+def router_settings():
+    return {
+        "max_error_rate": float(os.getenv('LLM_MAX_ERROR_RATE', 0.5)),
+        "min_samples": int(os.getenv('LLM_MIN_SAMPLES', 10)),
+        "hedge_default_ms": float(os.getenv('LLM_HEDGE_DEFAULT_MS', 8000)),
+    }
+
+
+def init_llm_router(app, clients):
+    """Registers the router over the pooled LLM clients on the Flask app."""
+    router = LLMRouter(clients, hedge_workers=int(os.getenv('LLM_HEDGE_WORKERS', 8)), **router_settings())
+    app.extensions['llm_router'] = router
+    return router
+
+
+def get_llm_router():
+    return current_app.extensions['llm_router']
@@ -0,0 +1,50 @@
+from database import create_connection
+from document_access import parse_access
+from rag import RAGService
+
+def indexed_sources(rag_service, page_size=1000):
+    """Every source_file in the vector store, including files ingested without a documents row."""
+    collection = rag_service.db._collection
+    sources = set()
+    offset = 0
+    while True:
+        results = collection.get(limit=page_size, offset=offset, include=['metadatas'])
+        if not results['ids']:
+            break
+        sources.update((metadata or {}).get('source_file', '') for metadata in results['metadatas'])
+        offset += len(results['ids'])
+    sources.discard('')
+    return sources
+
+def migrate_document_access():
+    conn = create_connection()
+    if conn:
+        try:
+            cursor = conn.cursor(dictionary=True)
+            print("Adding access_attributes column to documents...")
+
+            try:
+                cursor.execute("ALTER TABLE documents ADD COLUMN access_attributes TEXT NULL")
+                conn.commit()
+                print("Column added.")
+            except Exception as e:
+                print(f"Column creation skipped (might already exist): {e}")
+
+            cursor.execute("SELECT filename, access_attributes FROM documents")
+            rules = {row['filename']: parse_access(row['access_attributes']) for row in cursor.fetchall()}
+
+            # Chunks indexed before retrieval filtering carry no access tags and would be hidden
+            # from everyone; tag them from the documents table (public when there is no rule).
+            rag_service = RAGService()
+            for filename in sorted(indexed_sources(rag_service)):
+                access = rules.get(filename)
+                updated = rag_service.set_access(filename, access)
+                print(f"{filename}: {updated} chunks tagged ({'public' if not access else access})")
+
+            print("Migration completed successfully.")
+
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_document_access()
@@ -0,0 +1,24 @@
+from database import create_connection
+
+def migrate_document_created_at():
+    conn = create_connection()
+    if conn:
+        try:
+            cursor = conn.cursor()
+            print("Adding (created_at, id) index to documents...")
+
+            # Backs keyset pagination in GET /api/documents (ORDER BY created_at DESC, id DESC)
+            try:
+                cursor.execute("CREATE INDEX idx_documents_created_at ON documents(created_at, id)")
+                print("Index created.")
+            except Exception as e:
+                print(f"Index creation skipped (might already exist): {e}")
+
+            conn.commit()
+            print("Migration completed successfully.")
+
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_document_created_at()
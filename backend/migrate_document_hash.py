@@ -0,0 +1,52 @@
+import hashlib
+from database import create_connection
+from rag import RAGService
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def migrate_document_hash():
+    conn = create_connection()
+    if conn:
+        try:
+            cursor = conn.cursor(dictionary=True)
+            print("Adding content_hash column to documents...")
+
+            try:
+                cursor.execute("ALTER TABLE documents ADD COLUMN content_hash CHAR(64) NULL")
+                print("Column added.")
+            except Exception as e:
+                print(f"Column creation skipped (might already exist): {e}")
+
+            try:
+                cursor.execute("CREATE INDEX idx_documents_content_hash ON documents(content_hash)")
+                print("Index created.")
+            except Exception as e:
+                print(f"Index creation skipped: {e}")
+
+            # Backfill hashes for files that are still on disk and indexed. A hash marks a successful
+            # ingest (see jobs._confirm_content_hash): a document without chunks keeps NULL, so
+            # uploading it again ingests it instead of reporting a duplicate.
+            rag_service = RAGService()
+            cursor.execute("SELECT id, filename, filepath FROM documents WHERE content_hash IS NULL")
+            for doc in cursor.fetchall():
+                if rag_service.count_chunks(doc['filename']) == 0:
+                    print(f"Skipping document {doc['id']}: not indexed")
+                    continue
+                try:
+                    cursor.execute("UPDATE documents SET content_hash = %s WHERE id = %s", (file_sha256(doc['filepath']), doc['id']))
+                except OSError as e:
+                    print(f"Skipping document {doc['id']}: {e}")
+
+            conn.commit()
+            print("Migration completed successfully.")
+
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_document_hash()
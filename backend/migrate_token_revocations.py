@@ -0,0 +1,33 @@
+from database import create_connection
+
+def migrate_token_revocations():
+    conn = create_connection()
+    if conn:
+        try:
+            cursor = conn.cursor()
+            print("Creating token_revocations table...")
+
+            # Revoked auth tokens (by jti) and per-user access token cutoffs, see auth_tokens.RevocationList.
+            # Times are epoch seconds, the same clock as the token iat/exp claims.
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS token_revocations (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                jti VARCHAR(64) NULL,
+                user_id INT NULL,
+                revoked_at DOUBLE NOT NULL,
+                expires_at DOUBLE NOT NULL,
+                INDEX idx_token_revocations_expires (expires_at)
+            )
+            """)
+
+            # Rows past their expiry no longer matter, the tokens they cover are expired too
+            cursor.execute("DELETE FROM token_revocations WHERE expires_at < UNIX_TIMESTAMP()")
+
+            conn.commit()
+            print("Migration completed successfully.")
+
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_token_revocations()
@@ -0,0 +1,68 @@
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pdf2image
+import pytesseract
+
+OCR_LANG = 'kor+eng'  # Korean and English support
+
+# One process pool for the whole app: files ingested in parallel (bulk uploads) share its
+# OCR_WORKERS processes instead of each starting cpu_count() of their own.
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', os.cpu_count() or 1))
+# The pool is created inside a multithreaded server process, where fork can copy a lock held by
+# another thread and deadlock the child; workers come from a clean forkserver (spawn elsewhere)
+OCR_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS,
+                                            mp_context=multiprocessing.get_context(OCR_START_METHOD))
+    return _pool
+
+
+def _ocr_page(file_path, page_number, dpi, lang):
+    """Runs in a worker process: renders a single page and returns its text."""
+    images = pdf2image.convert_from_path(file_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    if not images:
+        return ""
+    text = pytesseract.image_to_string(images[0], lang=lang)
+    images[0].close()
+    return text
+
+
+def ocr_pdf(file_path, batch_size=None, dpi=200, lang=OCR_LANG):
+    """
+    OCRs an image-only PDF on the shared process pool.
+    Each worker renders and reads one page at a time and at most `batch_size`
+    pages of this file are queued, so memory stays flat regardless of the page count.
+    Yields (page_index, total_pages, text) in page order.
+    """
+    pool = get_ocr_pool()
+    batch_size = batch_size or int(os.getenv('OCR_BATCH_SIZE', OCR_WORKERS * 2))
+
+    total_pages = pdf2image.pdfinfo_from_path(file_path)['Pages']
+
+    in_flight = deque()
+    try:
+        next_page = 0
+        while next_page < total_pages or in_flight:
+            # Keep the window full, then hand back the oldest page so order is preserved
+            while next_page < total_pages and len(in_flight) < batch_size:
+                in_flight.append((next_page, pool.submit(_ocr_page, file_path, next_page + 1, dpi, lang)))
+                next_page += 1
+
+            page_index, future = in_flight.popleft()
+            yield page_index, total_pages, future.result()
+    finally:
+        # Also runs when the consumer stops early (e.g. the client disconnected): drop this
+        # file's queued pages; the shared pool keeps serving other files
+        for _, future in in_flight:
+            future.cancel()
@@ -5,17 +5,192 @@ from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 import shutil
-import pdf2image
-import pytesseract
+import time
+import queue
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from ocr import ocr_pdf
+from cache import TTLCache, SharedVersion
+from embedding_batcher import QueryEmbeddingBatcher
+from bm25 import BM25Index, reciprocal_rank_fusion
+from reranker import Reranker
+from document_access import ACL_PREFIX, access_metadata, access_tags, tags_from_metadata, chroma_where
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+# 'hybrid' fuses BM25 and vector results, 'vector' is dense similarity search only
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+# Optional cross-encoder second stage: rerank a wider candidate pool and keep the top-n
+RERANK_ENABLED = os.getenv('RERANK_ENABLED', '0') == '1'
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', 50))
+# Files ingested in parallel by ingest_files (bulk uploads)
+INGEST_CONCURRENCY = int(os.getenv('INGEST_CONCURRENCY', 3))
+
+def chunk_ids(filename, chunks):
+    """
+    Content-addressed chunk IDs: filename + hash of the chunk text.
+    Repeated texts within a file (e.g. page headers) get an occurrence suffix.
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        digest = hashlib.sha256(chunk.page_content.encode('utf-8')).hexdigest()[:16]
+        seen[digest] = seen.get(digest, 0) + 1
+        ids.append(f"{filename}_{digest}" if seen[digest] == 1 else f"{filename}_{digest}_{seen[digest]}")
+    return ids
 
 class RAGService:
-    def __init__(self, persist_directory="./chroma_db_v2"):
+    def __init__(self, persist_directory="./chroma_db_v2", model_name=EMBEDDING_MODEL_NAME,
+                 embedding_cache_path=None, embedding_cache_max_entries=None):
         self.persist_directory = persist_directory
-        self.embedding_function = SentenceTransformerEmbeddings(model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-        self.db = Chroma(persist_directory=self.persist_directory, embedding_function=self.embedding_function)
+        self.model_name = model_name
+        self.embedding_cache_path = embedding_cache_path or os.getenv('EMBEDDING_CACHE_PATH', './embedding_cache.sqlite')
+        self.embedding_cache_max_entries = embedding_cache_max_entries or int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 200000))
+        self.embedding_cache = None
+        # The SentenceTransformer and the Chroma client are loaded on first use (see `db`),
+        # so importing the app or spawning a worker does not pay for the model.
+        self._embedding_function = None
+        self._db = None
+        self._load_lock = threading.Lock()
+        # Keyword index kept in sync with the vector store by ingest_file / delete_file
+        self.bm25 = BM25Index(os.getenv('BM25_INDEX_PATH', './bm25_index.sqlite'),
+                              max_df_ratio=float(os.getenv('BM25_MAX_DF_RATIO', 0.2)),
+                              min_skip_df=int(os.getenv('BM25_MIN_SKIP_DF', 1000)))
+        # False while the keyword index is rebuilt in the background; retrieval stays vector-only until then
+        self.bm25_ready = True
+        # The cross-encoder model itself is only loaded on the first rerank
+        self.reranker = Reranker(
+            batch_size=int(os.getenv('RERANK_BATCH_SIZE', 16)),
+            time_budget=float(os.getenv('RERANK_TIME_BUDGET', 2.0)))
+
+        # Retrieval caches. Query embeddings only depend on the text; result lists are keyed
+        # by collection_version, which every write bumps, so stale results are never served.
+        # The version lives in a file shared by all worker processes, so an ingest or delete
+        # in one of them invalidates the result and answer caches of the others too.
+        self._collection_version = SharedVersion(os.getenv('COLLECTION_VERSION_PATH', './collection_version.sqlite'))
+        self.query_embedding_cache = TTLCache(
+            maxsize=int(os.getenv('QUERY_CACHE_SIZE', 1024)), ttl=int(os.getenv('QUERY_EMBEDDING_CACHE_TTL', 3600)))
+        self.query_result_cache = TTLCache(
+            maxsize=int(os.getenv('QUERY_CACHE_SIZE', 1024)), ttl=int(os.getenv('QUERY_RESULT_CACHE_TTL', 300)))
+        # Concurrent cache-missing queries are embedded together in one forward pass
+        self.query_batcher = QueryEmbeddingBatcher(
+            self._embed_query_batch,
+            max_batch_size=int(os.getenv('QUERY_BATCH_SIZE', 32)),
+            max_wait=float(os.getenv('QUERY_BATCH_WAIT_MS', 5)) / 1000)
+
+    @property
+    def embedding_function(self):
+        if self._embedding_function is None:
+            self._load()
+        return self._embedding_function
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._load()
+        return self._db
+
+    def _load(self):
+        with self._load_lock:
+            # Another thread may have finished loading while we waited for the lock
+            if self._embedding_function is None:
+                # Chunk embeddings go through a persistent cache keyed by (model, text hash),
+                # so re-ingesting unchanged chunks skips the SentenceTransformer forward pass.
+                self.embedding_cache = EmbeddingCache(self.embedding_cache_path, max_entries=self.embedding_cache_max_entries)
+                self._embedding_function = CachedEmbeddings(
+                    SentenceTransformerEmbeddings(model_name=self.model_name),
+                    self.embedding_cache,
+                    self.model_name,
+                )
+            if self._db is None:
+                self._db = Chroma(persist_directory=self.persist_directory, embedding_function=self._embedding_function)
+                self._start_bm25_backfill()
+
+    def _start_bm25_backfill(self):
+        """
+        Rebuilds the keyword index from the vector store when it is empty (chunks ingested
+        before it existed) or an earlier rebuild was interrupted. Runs on a background thread
+        so loading, and every request waiting on it, does not wait for the whole corpus.
+        """
+        interrupted = self.bm25.get_meta('backfill') == 'running'
+        if not interrupted and (self.bm25.count() > 0 or self._db._collection.count() == 0):
+            return
+        self.bm25_ready = False
+        threading.Thread(target=self._backfill_bm25, name="bm25-backfill", daemon=True).start()
+
+    def _backfill_bm25(self, page_size=500):
+        collection = self._db._collection
+        print("Building BM25 index from the vector store (vector-only retrieval until it is done)...")
+        started = time.time()
+        self.bm25.set_meta('backfill', 'running')
+        try:
+            self._copy_chunks_to_bm25(collection, page_size)
+        except Exception as e:
+            print(f"BM25 backfill failed, staying on vector-only retrieval: {e}")
+            return
+        self.bm25.set_meta('backfill', 'done')
+        self.bm25_ready = True
+        self._bump_version()
+        print(f"BM25 index built in {time.time() - started:.1f}s")
+
+    def _copy_chunks_to_bm25(self, collection, page_size):
+        offset = 0
+        source_tags = {}
+        while True:
+            results = collection.get(limit=page_size, offset=offset, include=['documents', 'metadatas'])
+            if not results['ids']:
+                break
+            self.bm25.add_many([
+                (chunk_id, (metadata or {}).get('source_file', ''), document or '')
+                for chunk_id, document, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+            ])
+            for metadata in results['metadatas']:
+                source_tags.setdefault((metadata or {}).get('source_file', ''), set()).update(tags_from_metadata(metadata))
+            offset += len(results['ids'])
+        for source_file, tags in source_tags.items():
+            self.bm25.set_source_access(source_file, sorted(tags))
+
+    def is_ready(self):
+        """True once the embedding model and vector store are loaded."""
+        return self._embedding_function is not None and self._db is not None
+
+    def warm_up(self):
+        """Loads the model and vector store eagerly and runs one embedding so the first request is fast."""
+        self._load()
+        self._embedding_function.embed_query("warm up")
+        return True
+
+    @property
+    def collection_version(self):
+        return self._collection_version.get()
+
+    def _bump_version(self):
+        """Marks the collection as changed, invalidating cached query results in every process."""
+        self._collection_version.bump()
+        self.query_result_cache.clear()
 
-    def ingest_file(self, file_path, chunk_size=1000, chunk_overlap=200):
-        """Ingests a single PDF file with idempotent IDs. Yields progress updates."""
+    def stats(self):
+        """Hit/miss counters for the retrieval caches."""
+        return {
+            "collection_version": self.collection_version,
+            "query_embedding_cache": self.query_embedding_cache.stats(),
+            "query_result_cache": self.query_result_cache.stats(),
+            "query_batcher": self.query_batcher.stats(),
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+            "bm25_ready": self.bm25_ready,
+            "reranker": self.reranker.stats()
+        }
+
+    def ingest_file(self, file_path, chunk_size=1000, chunk_overlap=200, batch_size=None, dry_run=False, access=None):
+        """
+        Ingests a single PDF file with content-addressed IDs. Yields progress updates.
+        Only chunks whose text changed are deleted, embedded and added; with dry_run
+        the diff against the indexed chunks is reported and nothing is written.
+        access is the document's access rule (see document_access), stored on every chunk.
+        """
         if not file_path.endswith(".pdf"):
             yield {"status": "error", "message": "Not a PDF file"}
             return
@@ -33,14 +208,11 @@ class RAGService:
                 yield {"status": "info", "message": "Image-only PDF detected. Starting OCR..."}
                 
                 try:
-                    images = pdf2image.convert_from_path(file_path)
-                    total_pages = len(images)
                     documents = []
-                    
-                    for i, image in enumerate(images):
+
+                    # Pages are rendered and OCR'd in a process pool, a bounded window at a time
+                    for i, total_pages, text in ocr_pdf(file_path):
                         yield {"status": "info", "message": f"OCR Processing page {i+1}/{total_pages}..."}
-                        # Extract text with Korean and English support
-                        text = pytesseract.image_to_string(image, lang='kor+eng')
                         if text.strip():
                             documents.append(Document(page_content=text, metadata={"source": file_path, "page": i}))
                     
@@ -57,71 +229,357 @@ class RAGService:
             text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
             chunks = text_splitter.split_documents(documents)
             
-            yield {"status": "info", "message": f"Generated {len(chunks)} chunks. Indexing to Vector DB..."}
+            yield {"status": "info", "message": f"Generated {len(chunks)} chunks. Comparing with indexed chunks..."}
             
-            # Generate unique IDs based on filename and chunk index to prevent duplicates
+            # Content-addressed IDs: an edited page only changes the IDs of its own chunks
             filename = os.path.basename(file_path)
-            ids = [f"{filename}_{i}" for i in range(len(chunks))]
+            ids = chunk_ids(filename, chunks)
             
-            # Add metadata for deletion
+            # Add metadata for deletion, and the access tags retrieval filters on
+            acl = access_metadata(access)
             for chunk in chunks:
                 chunk.metadata['source_file'] = filename
-            
-            # Clean up old chunks first to avoid ghosts
-            self.delete_file(filename)
-                
-            self.db.add_documents(chunks, ids=ids)
-            yield {"status": "success", "message": f"Ingested {len(chunks)} chunks from {filename}"}
+                chunk.metadata.update(acl)
+
+            diff = self._diff_chunks(filename, ids, chunks)
+            summary = (f"{len(diff['add'])} to add, {len(diff['delete'])} to delete, "
+                       f"{len(diff['update'])} metadata updates, {diff['unchanged']} unchanged")
+            if dry_run:
+                yield {
+                    "status": "success",
+                    "message": f"Dry run for {filename}: {summary}",
+                    "diff": {
+                        "add": len(diff['add']),
+                        "delete": len(diff['delete']),
+                        "update": len(diff['update']),
+                        "unchanged": diff['unchanged'],
+                        "delete_ids": diff['delete']
+                    }
+                }
+                return
+
+            yield {"status": "info", "message": f"Diff for {filename}: {summary}"}
+
+            cache_hits_before = self.embedding_cache.hits if self.embedding_cache else 0
+            try:
+                collection = self.db._collection
+                # Chunks that no longer exist (including legacy index-based IDs)
+                if diff['delete']:
+                    collection.delete(ids=diff['delete'])
+                    self.bm25.delete_ids(diff['delete'])
+
+                # Same text, different metadata (e.g. the chunk moved to another page): no re-embedding
+                if diff['update']:
+                    collection.update(ids=[i for i, _ in diff['update']],
+                                      metadatas=[self._replacing_metadata(diff['existing'][i], c.metadata) for i, c in diff['update']])
+                self.bm25.set_source_access(filename, access_tags(access))
+
+                new_ids = [i for i, _ in diff['add']]
+                new_chunks = [c for _, c in diff['add']]
+                if new_chunks:
+                    yield from self._index_chunks(new_ids, new_chunks, batch_size or EMBEDDING_BATCH_SIZE)
+            finally:
+                self._bump_version()
+            cache_hits = (self.embedding_cache.hits if self.embedding_cache else 0) - cache_hits_before
+            yield {"status": "success", "message": f"Ingested {len(chunks)} chunks from {filename} ({len(new_chunks)} new, {len(diff['delete'])} removed, {cache_hits} embeddings reused from cache)"}
             
         except Exception as e:
             yield {"status": "error", "message": str(e)}
 
+    def _diff_chunks(self, filename, ids, chunks):
+        """Compares the new chunk IDs with what is indexed for this file."""
+        existing = self.db._collection.get(where={"source_file": filename}, include=['metadatas'])
+        existing_meta = dict(zip(existing['ids'], existing['metadatas']))
+
+        new_ids = set(ids)
+        diff = {"add": [], "update": [], "unchanged": 0, "existing": existing_meta}
+        diff['delete'] = [chunk_id for chunk_id in existing['ids'] if chunk_id not in new_ids]
+        for chunk_id, chunk in zip(ids, chunks):
+            if chunk_id not in existing_meta:
+                diff['add'].append((chunk_id, chunk))
+            elif existing_meta[chunk_id] != chunk.metadata:
+                diff['update'].append((chunk_id, chunk))
+            else:
+                diff['unchanged'] += 1
+        return diff
+
+    @staticmethod
+    def _replacing_metadata(old, new):
+        """Chroma merges metadata on update; keys missing from `new` (e.g. revoked access tags) are removed with None."""
+        return dict(new, **{key: None for key in (old or {}) if key not in new})
+
+    def set_access(self, filename, access):
+        """
+        Changes the access rule of an indexed file in place: only chunk metadata and the
+        keyword index are updated, nothing is re-embedded.
+        """
+        collection = self.db._collection
+        existing = collection.get(where={"source_file": filename}, include=['metadatas'])
+        acl = access_metadata(access)
+        metadatas = []
+        for metadata in existing['metadatas']:
+            kept = {key: value for key, value in (metadata or {}).items() if not key.startswith(ACL_PREFIX)}
+            metadatas.append(self._replacing_metadata(metadata, dict(kept, **acl)))
+        try:
+            if existing['ids']:
+                collection.update(ids=existing['ids'], metadatas=metadatas)
+            self.bm25.set_source_access(filename, access_tags(access))
+        finally:
+            self._bump_version()
+        return len(existing['ids'])
+
+    def _index_chunks(self, ids, chunks, batch_size):
+        """
+        Embeds and upserts chunks in batches of batch_size. Batch N is written to Chroma
+        on a background thread while batch N+1 is being embedded. Yields per-batch progress.
+        """
+        total = len(chunks)
+        total_batches = (total + batch_size - 1) // batch_size
+        collection = self.db._collection
+        started = time.time()
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            pending_write = None
+            for batch_idx, start in enumerate(range(0, total, batch_size)):
+                batch = chunks[start:start + batch_size]
+                embeddings = self.embedding_function.embed_documents([c.page_content for c in batch])
+
+                # Wait for the previous batch before queueing the next, so at most one write is in flight
+                if pending_write:
+                    pending_write.result()
+                pending_write = writer.submit(self._write_batch, collection, ids[start:start + batch_size], embeddings, batch)
+
+                done += len(batch)
+                elapsed = time.time() - started
+                rate = done / elapsed if elapsed > 0 else 0.0
+                yield {
+                    "status": "info",
+                    "message": f"Embedded batch {batch_idx+1}/{total_batches} ({done}/{total} chunks, {rate:.1f} chunks/sec)",
+                    "batch": batch_idx + 1,
+                    "total_batches": total_batches,
+                    "chunks_done": done,
+                    "chunks_total": total,
+                    "chunks_per_sec": round(rate, 1)
+                }
+
+            if pending_write:
+                pending_write.result()
+
+    def _write_batch(self, collection, ids, embeddings, chunks):
+        """Upserts one batch into the vector store and the keyword index."""
+        collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=[c.page_content for c in chunks],
+            metadatas=[c.metadata for c in chunks],
+        )
+        self.bm25.add_many([(chunk_id, c.metadata.get('source_file', ''), c.page_content) for chunk_id, c in zip(ids, chunks)])
+
     def delete_file(self, filename):
         """Removes documents associated with a specific file."""
         try:
             # chroma delete by metadata
             self.db._collection.delete(where={"source_file": filename})
+            self.bm25.delete_source(filename)
+            self._bump_version()
             return True, f"Deleted content for {filename}"
         except Exception as e:
             return False, str(e)
 
-    def get_chunks_by_filename(self, filename: str):
+    def get_chunks_by_filename(self, filename: str, offset=0, limit=None, include_content=True,
+                               pages=None, page_from=None, page_to=None):
         """
-        Retrieves all chunks for a specific file from the vector store.
-        Returns a list of dicts with 'content' and 'metadata'.
+        Retrieves chunks for a specific file from the vector store, one page at a time.
+        Returns (chunks, next_offset): a list of dicts with 'id', 'metadata' and (unless
+        include_content is False) 'content', and the offset of the next page or None.
+        pages / page_from / page_to filter on the PDF page number stored in the metadata.
         """
+        where = self._chunk_filter(filename, pages, page_from, page_to)
+        include = ['metadatas', 'documents'] if include_content else ['metadatas']
         try:
-            results = self.db._collection.get(where={"source_file": filename})
+            # Ask for one extra row to know whether another page follows
+            results = self.db._collection.get(
+                where=where,
+                offset=offset,
+                limit=limit + 1 if limit else None,
+                include=include,
+            )
             
             # Chroma 'get' returns: {'ids': [], 'embeddings': None, 'documents': [], 'metadatas': []}
             chunks = []
-            if results['ids']:
-                for i in range(len(results['ids'])):
-                    chunks.append({
-                        "id": results['ids'][i],
-                        "content": results['documents'][i],
-                        "metadata": results['metadatas'][i]
-                    })
-            return chunks
+            ids = results['ids'][:limit] if limit else results['ids']
+            for i in range(len(ids)):
+                chunk = {"id": ids[i], "metadata": results['metadatas'][i]}
+                if include_content:
+                    chunk["content"] = results['documents'][i]
+                chunks.append(chunk)
+
+            next_offset = offset + limit if limit and len(results['ids']) > limit else None
+            return chunks, next_offset
         except Exception as e:
             print(f"Error fetching chunks: {e}")
-            return []
+            return [], None
+
+    def count_chunks(self, filename, pages=None, page_from=None, page_to=None):
+        """Number of chunks stored for a file, with the page filters of get_chunks_by_filename (IDs only)."""
+        where = self._chunk_filter(filename, pages, page_from, page_to)
+        return len(self.db._collection.get(where=where, include=[])['ids'])
+
+    @staticmethod
+    def _chunk_filter(filename, pages=None, page_from=None, page_to=None):
+        """Chroma where filter for the chunks of a file, optionally limited to some PDF pages."""
+        conditions = [{"source_file": filename}]
+        if pages:
+            conditions.append({"page": {"$in": list(pages)}})
+        if page_from is not None:
+            conditions.append({"page": {"$gte": page_from}})
+        if page_to is not None:
+            conditions.append({"page": {"$lte": page_to}})
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def ingest_files(self, file_paths, concurrency=None, **ingest_kwargs):
+        """
+        Ingests several files, at most `concurrency` at a time, so PDF parsing, OCR and
+        embedding of different files overlap. Yields each file's progress (tagged with
+        'file') as it happens, then overall progress after every finished file.
+        """
+        concurrency = max(1, concurrency or INGEST_CONCURRENCY)
+        total = len(file_paths)
+        events = queue.Queue()
+
+        def run(path):
+            name = os.path.basename(path)
+            final = None
+            try:
+                for update in self.ingest_file(path, **ingest_kwargs):
+                    update['file'] = name
+                    final = update
+                    events.put(('event', update))
+            except Exception as e:
+                final = {"status": "error", "message": str(e), "file": name}
+                events.put(('event', final))
+            finally:
+                events.put(('done', name, final))
+
+        succeeded = failed = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for path in file_paths:
+                pool.submit(run, path)
+
+            finished = 0
+            while finished < total:
+                item = events.get()
+                if item[0] == 'event':
+                    update = item[1]
+                    # Prefix update messages to indicate which file is being processed
+                    if update['status'] == 'info':
+                        update['message'] = f"[{update['file']}] {update['message']}"
+                    yield update
+                    continue
+
+                finished += 1
+                _, name, final = item
+                if final and final['status'] == 'success':
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield {
+                    "status": "info",
+                    "message": f"[{finished}/{total}] Finished {name}",
+                    "files_done": finished,
+                    "files_total": total,
+                    "files_failed": failed
+                }
+
+        yield {
+            "status": "success",
+            "message": f"Bulk ingestion finished: {succeeded} succeeded, {failed} failed.",
+            "files_succeeded": succeeded,
+            "files_failed": failed
+        }
 
     def ingest_pdfs(self, pdf_directory):
         """(Legacy) Loads PDFs from the directory."""
-        # Adapted to use new ingest_file for consistency
-        results = []
-        for filename in os.listdir(pdf_directory):
-            if filename.endswith(".pdf"):
-                file_path = os.path.join(pdf_directory, filename)
-                success, msg = self.ingest_file(file_path)
-                results.append(msg)
-        return {"status": "success", "messages": results}
-
-    def query(self, query_text, k=10):
-        """Retrieves relevant context for the query."""
-        results = self.db.similarity_search(query_text, k=k)
-        return [doc.page_content for doc in results]
+        # Adapted to use ingest_files: collect each file's final status message
+        file_paths = [os.path.join(pdf_directory, f) for f in sorted(os.listdir(pdf_directory)) if f.endswith(".pdf")]
+        results = {}
+        for update in self.ingest_files(file_paths):
+            if 'file' in update and update['status'] in ('success', 'error'):
+                results[update['file']] = update['message']
+        return {"status": "success", "messages": list(results.values())}
+
+    def embed_query(self, query_text):
+        """Query embedding, cached per query text."""
+        embedding = self.query_embedding_cache.get(query_text)
+        if embedding is None:
+            embedding = self.query_batcher.embed(query_text)
+            self.query_embedding_cache.set(query_text, embedding)
+        return embedding
+
+    def _embed_query_batch(self, texts):
+        # The SentenceTransformer embeds queries and documents the same way; going to the base
+        # model skips the chunk embedding cache, which should not fill up with questions.
+        return self.embedding_function.base.embed_documents(texts)
+
+    def retrieve(self, query_text, k=10, hybrid=None, rerank=None, candidates=None, tags=None):
+        """
+        Returns the top-k chunks as dicts with 'id', 'content' and 'metadata'.
+        In hybrid mode BM25 and vector candidates are fused by reciprocal rank fusion,
+        which recovers exact-term matches the embedding search misses.
+        With rerank, a pool of `candidates` chunks is rescored by the cross-encoder first.
+        tags (document_access.viewer_tags) limits retrieval to chunks the caller may read.
+        The filter runs inside the Chroma and BM25 queries, so all k slots go to readable chunks.
+        None means unrestricted.
+        """
+        hybrid = (RETRIEVAL_MODE == 'hybrid') if hybrid is None else hybrid
+        # An incomplete keyword index would skew fusion; use dense search alone until it is built
+        hybrid = bool(hybrid) and self.bm25_ready
+        rerank = RERANK_ENABLED if rerank is None else rerank
+        if rerank:
+            pool = self.retrieve(query_text, k=max(candidates or RERANK_CANDIDATES, k), hybrid=hybrid, rerank=False, tags=tags)
+            results, _ = self.reranker.rerank(query_text, pool, top_n=k)
+            return results
+
+        tags = tuple(tags) if tags is not None else None
+        result_key = (self.collection_version, query_text, k, hybrid, tags)
+        cached = self.query_result_cache.get(result_key)
+        if cached is not None:
+            return list(cached)
+
+        collection = self.db._collection
+        # Pull a wider candidate pool from each retriever so fusion has something to work with
+        fetch_k = max(k * 3, 20) if hybrid else k
+        vector = collection.query(
+            query_embeddings=[self.embed_query(query_text)],
+            n_results=fetch_k,
+            where=chroma_where(tags) if tags is not None else None,
+            include=['documents', 'metadatas'],
+        )
+        chunks = {
+            chunk_id: {"id": chunk_id, "content": document, "metadata": metadata or {}}
+            for chunk_id, document, metadata in zip(vector['ids'][0], vector['documents'][0], vector['metadatas'][0])
+        }
+        ranked_ids = list(vector['ids'][0])
+
+        if hybrid:
+            keyword_ids = [chunk_id for chunk_id, _ in self.bm25.search(query_text, limit=fetch_k, tags=tags)]
+            ranked_ids = [chunk_id for chunk_id, _ in reciprocal_rank_fusion([ranked_ids, keyword_ids])]
+
+            # Keyword-only hits still need their text from the vector store
+            missing = [chunk_id for chunk_id in ranked_ids[:k] if chunk_id not in chunks]
+            if missing:
+                extra = collection.get(ids=missing, include=['documents', 'metadatas'])
+                for chunk_id, document, metadata in zip(extra['ids'], extra['documents'], extra['metadatas']):
+                    chunks[chunk_id] = {"id": chunk_id, "content": document, "metadata": metadata or {}}
+
+        results = [chunks[chunk_id] for chunk_id in ranked_ids if chunk_id in chunks][:k]
+        self.query_result_cache.set(result_key, results)
+        return list(results)
+
+    def query(self, query_text, k=10, hybrid=None, rerank=None, tags=None):
+        """Retrieves relevant context for the query (restricted to `tags`, see retrieve)."""
+        return [chunk['content'] for chunk in self.retrieve(query_text, k=k, hybrid=hybrid, rerank=rerank, tags=tags)]
 
     def clear_db(self):
         """Clears the vector database."""
@@ -129,4 +587,22 @@ class RAGService:
             shutil.rmtree(self.persist_directory)
             os.makedirs(self.persist_directory)
             # Re-init
-            self.db = Chroma(persist_directory=self.persist_directory, embedding_function=self.embedding_function)
+            self._db = Chroma(persist_directory=self.persist_directory, embedding_function=self.embedding_function)
+            self.bm25.clear()
+            self._bump_version()
+
+
+def init_rag_service(app, **kwargs):
+    """Registers one shared RAGService on the Flask app. Nothing heavy is loaded here."""
+    service = RAGService(**kwargs)
+    app.extensions['rag_service'] = service
+
+    # Optional warm-up so the model is loaded in the background right after the worker starts
+    if os.getenv('RAG_WARMUP', '0') == '1':
+        threading.Thread(target=service.warm_up, name="rag-warmup", daemon=True).start()
+
+    return service
+
+def get_rag_service():
+    """Returns the RAGService registered on the current Flask app."""
+    return current_app.extensions['rag_service']
@@ -0,0 +1,74 @@
+import os
+import time
+import hashlib
+import threading
+from cache import TTLCache
+
+# Multilingual (incl. Korean) MS MARCO cross-encoder, small enough for CPU
+RERANK_MODEL_NAME = os.getenv('RERANK_MODEL', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1')
+
+
+class Reranker:
+    """
+    Second retrieval stage: scores (query, chunk) pairs with a local cross-encoder
+    and keeps the best top_n. Scores are cached per (query, chunk text). If scoring
+    takes longer than time_budget seconds the original (vector/fusion) order is kept.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL_NAME, batch_size=16, time_budget=2.0):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.score_cache = TTLCache(maxsize=int(os.getenv('RERANK_CACHE_SIZE', 20000)), ttl=3600)
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def _key(self, query_text, content):
+        return (query_text, hashlib.sha256(content.encode('utf-8')).hexdigest())
+
+    def rerank(self, query_text, chunks, top_n):
+        """Returns (chunks, reranked). reranked is False when the time budget forced a fallback."""
+        model = self.model  # Load outside the time budget; only the first call pays for it
+        started = time.monotonic()
+        scores = {}
+        pending = []
+        for idx, chunk in enumerate(chunks):
+            score = self.score_cache.get(self._key(query_text, chunk['content']))
+            if score is None:
+                pending.append(idx)
+            else:
+                scores[idx] = score
+
+        for start in range(0, len(pending), self.batch_size):
+            if time.monotonic() - started > self.time_budget:
+                self.fallbacks += 1
+                print(f"Rerank over time budget ({self.time_budget}s), keeping retrieval order")
+                return chunks[:top_n], False
+            batch = pending[start:start + self.batch_size]
+            batch_scores = model.predict([(query_text, chunks[idx]['content']) for idx in batch])
+            for idx, score in zip(batch, batch_scores):
+                scores[idx] = float(score)
+                self.score_cache.set(self._key(query_text, chunks[idx]['content']), float(score))
+
+        self.reranked += 1
+        order = sorted(range(len(chunks)), key=lambda idx: scores[idx], reverse=True)
+        return [dict(chunks[idx], rerank_score=scores[idx]) for idx in order[:top_n]], True
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+            "score_cache": self.score_cache.stats()
+        }
@@ -8,6 +8,7 @@ import DocumentManager from './components/DocumentManager.jsx';
 import UserManager from './components/UserManager.jsx';
 import Settings from './components/Settings.jsx';
 import LegalNotice from './components/LegalNotice.jsx';
+import { logout } from './auth';
 
 function App() {
     const [user, setUser] = useState(null); // replaces token, stores full user obj
@@ -17,14 +18,17 @@ function App() {
         // Clear any previous chat history for this user on new login
         if (userData && userData.username) {
             sessionStorage.removeItem(`chat_history_${userData.username}`);
+            sessionStorage.removeItem(`chat_conversation_${userData.username}`);
         }
         setUser(userData);
         setView('chat');
     };
 
     const handleLogout = () => {
+        logout(); // Revokes the tokens on the server
         if (user && user.username) {
             sessionStorage.removeItem(`chat_history_${user.username}`);
+            sessionStorage.removeItem(`chat_conversation_${user.username}`);
         }
         setUser(null);
         setView('login');
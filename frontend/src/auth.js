@@ -0,0 +1,88 @@
+import axios from 'axios';
+
+// Signed tokens from /api/login. Kept in sessionStorage like the chat history, so they go away with the tab.
+const TOKENS_KEY = 'auth_tokens';
+
+export const getTokens = () => {
+    const saved = sessionStorage.getItem(TOKENS_KEY);
+    return saved ? JSON.parse(saved) : null;
+};
+
+export const setTokens = ({ access_token, refresh_token }) => {
+    sessionStorage.setItem(TOKENS_KEY, JSON.stringify({ access_token, refresh_token }));
+};
+
+export const clearTokens = () => {
+    sessionStorage.removeItem(TOKENS_KEY);
+};
+
+export const authHeaders = () => {
+    const tokens = getTokens();
+    return tokens ? { Authorization: `Bearer ${tokens.access_token}` } : {};
+};
+
+// Concurrent 401s share one refresh call (refresh tokens are single use)
+let refreshing = null;
+
+export const refreshTokens = () => {
+    const tokens = getTokens();
+    if (!tokens) return Promise.resolve(false);
+    if (!refreshing) {
+        refreshing = fetch('/api/token/refresh', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: tokens.refresh_token }),
+        })
+            .then(async (response) => {
+                if (!response.ok) {
+                    clearTokens();
+                    return false;
+                }
+                setTokens(await response.json());
+                return true;
+            })
+            .catch(() => false)
+            .finally(() => { refreshing = null; });
+    }
+    return refreshing;
+};
+
+// fetch() with the access token; an expired or revoked token is refreshed once and the call retried
+export const authFetch = async (url, options = {}) => {
+    const send = () => fetch(url, { ...options, headers: { ...(options.headers || {}), ...authHeaders() } });
+    const response = await send();
+    if (response.status === 401 && getTokens() && await refreshTokens()) {
+        return send();
+    }
+    return response;
+};
+
+export const logout = async () => {
+    const tokens = getTokens();
+    if (tokens) {
+        await fetch('/api/logout', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', ...authHeaders() },
+            body: JSON.stringify({ refresh_token: tokens.refresh_token }),
+        }).catch(() => {});
+    }
+    clearTokens();
+};
+
+// Same behaviour for every axios call
+export const installAuthInterceptors = () => {
+    axios.interceptors.request.use((config) => {
+        config.headers = { ...(config.headers || {}), ...authHeaders() };
+        return config;
+    });
+    axios.interceptors.response.use(undefined, async (error) => {
+        const config = error.config;
+        if (error.response && error.response.status === 401 && config && !config._retried && getTokens()) {
+            config._retried = true;
+            if (await refreshTokens()) {
+                return axios(config);
+            }
+        }
+        return Promise.reject(error);
+    });
+};
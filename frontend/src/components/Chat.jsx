@@ -2,6 +2,7 @@ import { useState, useEffect, useRef } from 'react';
 import { useTranslation } from 'react-i18next';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
+import { authFetch } from '../auth';
 
 const Chat = ({ user, onLogout, onOpenSettings }) => {
     const { t } = useTranslation();
@@ -55,28 +56,83 @@ const Chat = ({ user, onLogout, onOpenSettings }) => {
         setInput('');
         setIsLoading(true);
 
+        // The server keeps the conversation (rolling summary + recent turns), so only the new message is sent
+        const conversationKey = user && user.username ? `chat_conversation_${user.username}` : null;
+        const postMessage = (conversationId) => authFetch('/api/chat', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                message: userMessage.text,
+                model: currentModel,
+                stream: true,
+                ...(conversationId ? { conversation_id: conversationId } : { conversation: true })
+            }),
+        });
+
         try {
-            const response = await fetch('/api/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    message: userMessage.text,
-                    model: currentModel
-                }),
-            });
-
-            const data = await response.json();
-
-            if (response.ok) {
-                // Determine response text based on format (ollama usually returns 'response', gemini logic we added returns 'response' too)
-                const text = data.response;
-                const botMessage = { text: text, sender: currentModel };
-                setMessages((prev) => [...prev, botMessage]);
-            } else {
+            let response = await postMessage(conversationKey && sessionStorage.getItem(conversationKey));
+            if (response.status === 404) {
+                // The conversation expired on the server: start a new one
+                response = await postMessage(null);
+            }
+
+            if (!response.ok) {
+                const data = await response.json();
                 const errorMessage = { text: "Error: " + (data.error || "Failed to fetch response"), sender: 'system' };
                 setMessages((prev) => [...prev, errorMessage]);
+                return;
+            }
+
+            // Add an empty bot message and grow it as tokens stream in (NDJSON, one event per line)
+            setMessages((prev) => [...prev, { text: '', sender: currentModel }]);
+            const appendToBotMessage = (token) => {
+                setMessages((prev) => {
+                    const updated = [...prev];
+                    const last = updated[updated.length - 1];
+                    updated[updated.length - 1] = { ...last, text: last.text + token };
+                    return updated;
+                });
+            };
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop(); // Keep the incomplete line in buffer
+
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    try {
+                        const update = JSON.parse(line);
+                        if (update.status === 'token') {
+                            // First token arrived: stop showing the "thinking" indicator
+                            setIsLoading(false);
+                            appendToBotMessage(update.token);
+                        } else if (update.status === 'done') {
+                            if (conversationKey && update.conversation_id) {
+                                sessionStorage.setItem(conversationKey, update.conversation_id);
+                            }
+                        } else if (update.status === 'error') {
+                            const errorMessage = { text: "Error: " + update.message, sender: 'system' };
+                            // Drop the bot message if nothing was streamed into it yet
+                            setMessages((prev) => {
+                                const last = prev[prev.length - 1];
+                                const kept = last && last.sender !== 'user' && last.text === '' ? prev.slice(0, -1) : prev;
+                                return [...kept, errorMessage];
+                            });
+                        }
+                    } catch (err) {
+                        console.error("Error parsing stream:", err);
+                    }
+                }
             }
         } catch (error) {
             const errorMessage = { text: "Network error: " + error.message, sender: 'system' };
@@ -91,6 +147,11 @@ const Chat = ({ user, onLogout, onOpenSettings }) => {
             setMessages([]);
             if (user && user.username) {
                 sessionStorage.removeItem(`chat_history_${user.username}`);
+                const conversationId = sessionStorage.getItem(`chat_conversation_${user.username}`);
+                if (conversationId) {
+                    authFetch(`/api/conversations/${conversationId}`, { method: 'DELETE' }).catch(() => {});
+                    sessionStorage.removeItem(`chat_conversation_${user.username}`);
+                }
             }
         }
     };
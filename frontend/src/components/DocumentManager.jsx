@@ -1,6 +1,7 @@
 
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { authFetch } from '../auth';
 import VectorViewer from './VectorViewer';
 import { useTranslation } from 'react-i18next';
 
@@ -16,12 +17,16 @@ const DocumentManager = ({ user }) => {
     const [viewingFile, setViewingFile] = useState(null);
     const [chunks, setChunks] = useState([]);
     const [chunksLoading, setChunksLoading] = useState(false);
+    const [chunksNextOffset, setChunksNextOffset] = useState(null);
 
     // Pagination State
     const [page, setPage] = useState(1);
     const [limit, setLimit] = useState(10);
     const [totalDocs, setTotalDocs] = useState(0);
     const [totalPages, setTotalPages] = useState(0);
+    // Keyset cursors: pageCursors[i] fetches page i + 1 (page 1 needs none)
+    const [pageCursors, setPageCursors] = useState([null]);
+    const [hasNextPage, setHasNextPage] = useState(false);
 
     // Ingestion Settings State
     const [ingestSettings, setIngestSettings] = useState(() => {
@@ -41,13 +46,19 @@ const DocumentManager = ({ user }) => {
 
     const fetchDocuments = async () => {
         try {
-            const response = await axios.get(`/api/documents?page=${page}&limit=${limit}`, {
-                headers: { 'X-Username': user.username }
-            });
+            const cursor = pageCursors[page - 1];
+            const query = cursor ? `cursor=${encodeURIComponent(cursor)}` : `page=${page}`;
+            const response = await axios.get(`/api/documents?${query}&limit=${limit}`);
             if (response.data.documents) {
                 setDocuments(response.data.documents);
                 setTotalDocs(response.data.total);
                 setTotalPages(response.data.total_pages);
+                setHasNextPage(response.data.next_cursor !== null);
+                setPageCursors(prev => {
+                    const next = prev.slice(0, page);
+                    next[page] = response.data.next_cursor;
+                    return next;
+                });
             } else {
                 // Fallback for legacy response or edge cases
                 setDocuments(response.data);
@@ -76,13 +87,12 @@ const DocumentManager = ({ user }) => {
 
         const formData = new FormData();
         formData.append('file', file);
-        formData.append('username', user.username);
         // Pass ingestion settings
         formData.append('chunk_size', ingestSettings.chunkSize);
         formData.append('chunk_overlap', ingestSettings.chunkOverlap);
 
         try {
-            const response = await fetch('/api/documents', {
+            const response = await authFetch('/api/documents', {
                 method: 'POST',
                 body: formData,
             });
@@ -149,12 +159,11 @@ const DocumentManager = ({ user }) => {
         setProgress([]);
 
         const formData = new FormData();
-        formData.append('username', user.username);
         formData.append('chunk_size', ingestSettings.chunkSize);
         formData.append('chunk_overlap', ingestSettings.chunkOverlap);
 
         try {
-            const response = await fetch(`/api/documents/${doc.id}/reingest`, {
+            const response = await authFetch(`/api/documents/${doc.id}/reingest`, {
                 method: 'POST',
                 body: formData,
             });
@@ -176,12 +185,11 @@ const DocumentManager = ({ user }) => {
         setProgress([]);
 
         const formData = new FormData();
-        formData.append('username', user.username);
         formData.append('chunk_size', ingestSettings.chunkSize);
         formData.append('chunk_overlap', ingestSettings.chunkOverlap);
 
         try {
-            const response = await fetch(`/api/documents/reingest-all`, {
+            const response = await authFetch(`/api/documents/reingest-all`, {
                 method: 'POST',
                 body: formData,
             });
@@ -240,9 +248,7 @@ const DocumentManager = ({ user }) => {
         if (!window.confirm("Are you sure you want to delete this document?")) return;
 
         try {
-            await axios.delete(`/api/documents/${id}`, {
-                headers: { 'X-Username': user.username }
-            });
+            await axios.delete(`/api/documents/${id}`);
             setMessage({ type: 'success', text: 'Document deleted' });
             fetchDocuments();
         } catch (error) {
@@ -255,8 +261,6 @@ const DocumentManager = ({ user }) => {
         try {
             await axios.put(`/api/documents/${id}`, {
                 description: newDescription
-            }, {
-                headers: { 'X-Username': user.username }
             });
             fetchDocuments(); // Refresh list to show new description
 
@@ -272,15 +276,15 @@ const DocumentManager = ({ user }) => {
         }
     };
 
-    const handleViewChunks = async (doc) => {
-        setViewingFile(doc); // Store whole doc object instead of just filename
-        setViewerOpen(true);
+    const CHUNK_PAGE_SIZE = 50;
+
+    // Chunks are paged by the backend; offset 0 replaces the list, later pages are appended
+    const fetchChunks = async (doc, offset) => {
         setChunksLoading(true);
         try {
-            const response = await axios.get(`/api/documents/${doc.id}/chunks`, {
-                headers: { 'X-Username': user.username }
-            });
-            setChunks(response.data);
+            const response = await axios.get(`/api/documents/${doc.id}/chunks?offset=${offset}&limit=${CHUNK_PAGE_SIZE}`);
+            setChunks(prev => offset === 0 ? response.data.chunks : [...prev, ...response.data.chunks]);
+            setChunksNextOffset(response.data.next_offset);
         } catch (error) {
             console.error("Error fetching chunks:", error);
             setMessage({ type: 'error', text: 'Failed to fetch vector chunks' });
@@ -289,6 +293,13 @@ const DocumentManager = ({ user }) => {
         }
     };
 
+    const handleViewChunks = async (doc) => {
+        setViewingFile(doc); // Store whole doc object instead of just filename
+        setViewerOpen(true);
+        setChunks([]);
+        await fetchChunks(doc, 0);
+    };
+
     return (
         <div style={{ maxWidth: '800px', margin: '0 auto' }}>
             <h2 style={{
@@ -486,6 +497,7 @@ const DocumentManager = ({ user }) => {
                                     value={limit}
                                     onChange={(e) => {
                                         setLimit(Number(e.target.value));
+                                        setPageCursors([null]); // Cursors depend on the page size
                                         setPage(1); // Reset to first page on limit change
                                     }}
                                     style={{ padding: '4px', borderRadius: '4px', border: '1px solid #dbdbdb' }}
@@ -511,18 +523,18 @@ const DocumentManager = ({ user }) => {
                                     &lt;
                                 </button>
                                 <span style={{ fontSize: '14px', color: '#666' }}>
-                                    {t('documents.page_info', { current: page, total: totalPages })}
+                                    {t('documents.page_info', { current: page, total: Math.max(totalPages, page) })}
                                 </span>
                                 <button
-                                    onClick={() => setPage(prev => Math.min(prev + 1, totalPages))}
-                                    disabled={page === totalPages || totalPages === 0}
+                                    onClick={() => setPage(prev => prev + 1)}
+                                    disabled={!hasNextPage}
                                     style={{
                                         padding: '4px 12px',
                                         border: '1px solid #dbdbdb',
-                                        background: (page === totalPages || totalPages === 0) ? '#f0f0f0' : 'white',
+                                        background: !hasNextPage ? '#f0f0f0' : 'white',
                                         borderRadius: '4px',
-                                        cursor: (page === totalPages || totalPages === 0) ? 'not-allowed' : 'pointer',
-                                        color: (page === totalPages || totalPages === 0) ? '#ccc' : '#333'
+                                        cursor: !hasNextPage ? 'not-allowed' : 'pointer',
+                                        color: !hasNextPage ? '#ccc' : '#333'
                                     }}
                                 >
                                     &gt;
@@ -540,6 +552,8 @@ const DocumentManager = ({ user }) => {
                 onDescriptionUpdate={handleDescriptionUpdate}
                 chunks={chunks}
                 loading={chunksLoading}
+                hasMore={chunksNextOffset !== null}
+                onLoadMore={() => fetchChunks(viewingFile, chunksNextOffset)}
             />
 
             <IngestionSettingsDialog
@@ -1,6 +1,7 @@
 import { useState } from 'react';
 
 import { useTranslation } from 'react-i18next';
+import { setTokens } from '../auth';
 
 const Login = ({ onLogin, onSwitchToRegister }) => {
     const { t } = useTranslation();
@@ -26,6 +27,8 @@ const Login = ({ onLogin, onSwitchToRegister }) => {
             const data = await response.json();
 
             if (response.ok) {
+                // Signed access/refresh tokens identify the user on every later call
+                setTokens(data);
                 // Pass the user details returned from backend
                 onLogin({ name: data.name, username: username, attributes: data.attributes });
             } else {
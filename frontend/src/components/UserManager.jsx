@@ -24,9 +24,7 @@ const UserManager = ({ user }) => {
 
     const fetchUsers = async () => {
         try {
-            const response = await axios.get(`/api/users`, {
-                headers: { 'X-Username': user.username }
-            });
+            const response = await axios.get(`/api/users`);
             setUsers(response.data);
         } catch (error) {
             console.error("Error fetching users:", error);
@@ -42,8 +40,6 @@ const UserManager = ({ user }) => {
                 action,
                 key,
                 value
-            }, {
-                headers: { 'X-Username': user.username }
             });
             setMessage({ type: 'success', text: `Attribute ${action}ed successfully` });
             fetchUsers(); // Refresh list to see changes
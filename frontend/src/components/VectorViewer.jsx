@@ -1,7 +1,7 @@
 import React from 'react';
 import { useTranslation } from 'react-i18next';
 
-const VectorViewer = ({ isOpen, onClose, document, onDescriptionUpdate, chunks, loading }) => {
+const VectorViewer = ({ isOpen, onClose, document, onDescriptionUpdate, chunks, loading, hasMore, onLoadMore }) => {
     const { t } = useTranslation();
     if (!isOpen || !document) return null;
 
@@ -87,7 +87,7 @@ const VectorViewer = ({ isOpen, onClose, document, onDescriptionUpdate, chunks,
                 </div>
 
                 <div style={{ flex: 1, overflowY: 'auto', padding: '1rem', background: '#fafafa' }}>
-                    {loading ? (
+                    {loading && chunks.length === 0 ? (
                         <div style={{ textAlign: 'center', padding: '2rem' }}>{t('vector_viewer.loading')}</div>
                     ) : chunks.length === 0 ? (
                         <div style={{ textAlign: 'center', padding: '2rem' }}>{t('vector_viewer.no_chunks')}</div>
@@ -122,6 +122,23 @@ const VectorViewer = ({ isOpen, onClose, document, onDescriptionUpdate, chunks,
                                     </div>
                                 </div>
                             ))}
+                            {hasMore && (
+                                <button
+                                    onClick={onLoadMore}
+                                    disabled={loading}
+                                    style={{
+                                        background: 'transparent',
+                                        border: '1px solid #dbdbdb',
+                                        borderRadius: '8px',
+                                        cursor: 'pointer',
+                                        padding: '0.75rem',
+                                        color: '#0095f6',
+                                        fontWeight: '600'
+                                    }}
+                                >
+                                    {loading ? t('vector_viewer.loading') : t('vector_viewer.load_more')}
+                                </button>
+                            )}
                         </div>
                     )}
                 </div>
@@ -3,6 +3,9 @@ import ReactDOM from 'react-dom/client'
 import App from './App.jsx'
 import './i18n'; // Initialize i18n
 import './index.css'
+import { installAuthInterceptors } from './auth';
+
+installAuthInterceptors(); // Bearer token on every axios call
 
 ReactDOM.createRoot(document.getElementById('root')).render(
     <React.StrictMode>